@@ -1,39 +1,114 @@
 import streamlit as st
-import subprocess
+import codecs
+import collections
+import datetime
 import os
-import sys
 import logging
 from streamlit_autorefresh import st_autorefresh
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+from src.service.client import MissionClient
 
 logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').setLevel(logging.ERROR)
 logging.getLogger('streamlit.server.server').setLevel(logging.ERROR)
 
+WORKSPACE = "workspace"
+MAX_LOG_LINES = 2000            # Ring buffer shown in the log pane
+MAX_INITIAL_BYTES = 256 * 1024  # Don't replay megabytes of old log on first load
+
+class WorkspaceWatcher(FileSystemEventHandler):
+    """Bumps a version counter whenever the workspace changes."""
+    def __init__(self):
+        self.version = 0
+    def on_any_event(self, event):
+        self.version += 1
+
+@st.cache_resource
+def workspace_watcher() -> WorkspaceWatcher:
+    os.makedirs(WORKSPACE, exist_ok=True)
+    handler = WorkspaceWatcher()
+    observer = Observer()
+    observer.schedule(handler, WORKSPACE, recursive=False)
+    observer.daemon = True
+    observer.start()
+    return handler
+
+@st.cache_data(max_entries=4)
+def list_workspace(version: int) -> list:
+    return sorted(os.listdir(WORKSPACE))
+
+@st.cache_data(max_entries=64)
+def read_file(path: str, mtime: float) -> str:
+    with open(path, "r", encoding="utf-8", errors="replace") as f: return f.read()
+
+def reset_log_tail():
+    st.session_state.log_offset = None
+    st.session_state.log_lines = collections.deque(maxlen=MAX_LOG_LINES)
+    st.session_state.log_partial = ""
+    st.session_state.log_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+def tail_log(log_path: str):
+    """Read only the bytes appended since the last refresh."""
+    state = st.session_state
+    if "log_lines" not in state or state.get("log_path") != log_path:
+        reset_log_tail()
+        state.log_path = log_path
+    try: size = os.path.getsize(log_path)
+    except OSError: return None
+    if state.log_offset is None or size < state.log_offset:
+        # First view or the log was truncated by a new launch
+        reset_log_tail()
+        state.log_offset = max(0, size - MAX_INITIAL_BYTES)
+    if size > state.log_offset:
+        with open(log_path, "rb") as f:
+            f.seek(state.log_offset)
+            chunk = f.read(size - state.log_offset)
+        state.log_offset += len(chunk)
+        lines = (state.log_partial + state.log_decoder.decode(chunk)).split("\n")
+        state.log_partial = lines.pop()
+        state.log_lines.extend(lines)
+    return "\n".join([*state.log_lines, state.log_partial])
+
 st.set_page_config(page_title="EMACS Pro", layout="wide")
 st.title("🤖 EMACS v5.0 (Gemma-Abliterated Edition)")
 
+client = MissionClient()
+service_up = client.is_alive()
+
 col1, col2 = st.columns([1, 2])
 with col1:
     if "objective" not in st.session_state: st.session_state.objective = ""
     objective = st.text_area("Objective:", key="input_obj")
-    
-    if st.button("🚀 Launch"):
-        with open("mission_log.txt", "w") as f: f.write("Starting...\n")
-        logfile = open("mission_log.txt", "w", encoding="utf-8")
-        subprocess.Popen([sys.executable, "-u", "main.py", objective], stdout=logfile, stderr=subprocess.STDOUT)
-        st.success("Started!")
-        
+
+    if not service_up:
+        st.error("Worker service is not running. Start it with: python -m src.service.worker")
+    elif st.button("🚀 Launch", disabled=not objective.strip()):
+        job = client.submit(objective.strip())
+        st.session_state.job_id = job["id"]
+        st.success(f"Queued mission {job['id']}")
+
+    jobs = client.list() if service_up else []
+    if jobs:
+        labels = {j["id"]: f"{j['status']:>9} · {datetime.datetime.fromtimestamp(j['created_at']):%H:%M:%S} · {j['objective'][:40]}" for j in jobs}
+        ids = list(labels)
+        current = st.session_state.get("job_id")
+        st.session_state.job_id = st.selectbox("Mission:", ids, index=ids.index(current) if current in ids else 0, format_func=labels.get)
+        selected = next(j for j in jobs if j["id"] == st.session_state.job_id)
+        if selected["status"] in ("queued", "running") and st.button("🛑 Cancel"):
+            client.cancel(selected["id"])
+
     st.divider()
-    if os.path.exists("workspace"):
-        files = os.listdir("workspace")
-        if files:
-            selected_file = st.selectbox("Select File:", files)
-            path = os.path.join("workspace", selected_file)
-            if os.path.isfile(path):
-                with open(path, "r", encoding="utf-8") as f: st.code(f.read(), language="python")
+    files = list_workspace(workspace_watcher().version)
+    if files:
+        selected_file = st.selectbox("Select File:", files)
+        path = os.path.join(WORKSPACE, selected_file)
+        if os.path.isfile(path):
+            st.code(read_file(path, os.path.getmtime(path)), language="python")
 
 with col2:
     st.subheader("Logs")
     st_autorefresh(interval=1000, key="logrefresh")
-    try:
-        with open("mission_log.txt", "r") as f: st.code(f.read())
-    except: st.info("No logs.")
+    job = next((j for j in jobs if j["id"] == st.session_state.get("job_id")), None)
+    logs = tail_log(job["log_path"]) if job else None
+    if logs is None: st.info("No logs.")
+    else: st.code(logs)
@@ -0,0 +1,113 @@
+"""Offline end-to-end mission benchmark: run canned objectives against the stub LLM and store timings as JSON."""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench.stub_llm import StubServer
+
+def _bench_config(base_url: str, state_dir: str) -> str:
+    """Copy of the genome pointed at the stub, with replay caches off so every call is measured.
+    Skills, notes, checkpoints, sandboxes and published files all go under state_dir, away from the real ones."""
+    with open(os.path.join(ROOT, "genome_config.json"), encoding="utf-8") as f: config = json.load(f)
+    config["llm_base_url"] = base_url
+    config.setdefault("llm_cache", {})["enabled"] = False
+    config["obsidian_vault_path"] = os.path.join(state_dir, "memory_logs")
+    # Repeats would otherwise replay the first run's stored skill instead of exercising the coder
+    config.setdefault("memory", {}).update(chroma_path=os.path.join(state_dir, "chroma_db"), reuse_enabled=False)
+    config.setdefault("checkpoint", {})["dir"] = os.path.join(state_dir, "checkpoints")
+    config.setdefault("sandbox", {}).update(workspace_root=os.path.join(state_dir, "sandboxes"),
+                                            publish_dir=os.path.join(state_dir, "workspace"))
+    fd, path = tempfile.mkstemp(prefix="emacs_bench_", suffix=".json", dir=state_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f: json.dump(config, f, indent=2)
+    return path
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _compare(current: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f: baseline = {r["name"]: r for r in json.load(f)["runs"]}
+    print("\n📊 Compared to baseline:")
+    for run in current["runs"]:
+        old = baseline.get(run["name"])
+        if not old: continue
+        delta = run["wall_s"] - old["wall_s"]
+        print(f"   {run['name']}: {run['wall_s']:.2f}s ({delta:+.2f}s)")
+        for name, p in run["phases"].items():
+            before = old["phases"].get(name, {}).get("total_s", 0.0)
+            print(f"      {name}: {p['total_s']:.3f}s ({p['total_s'] - before:+.3f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scenarios", default=os.path.join(ROOT, "bench", "scenarios.json"))
+    parser.add_argument("--only", nargs="*", help="Scenario names to run")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--out", default=os.path.join(ROOT, "bench", "results"))
+    parser.add_argument("--baseline", help="Earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    with open(args.scenarios, encoding="utf-8") as f: scenarios = json.load(f)
+    if args.only: scenarios = [s for s in scenarios if s["name"] in args.only]
+
+    stub = StubServer().start()
+    state_dir = tempfile.mkdtemp(prefix="emacs_bench_")
+    config_path = _bench_config(stub.base_url, state_dir)
+    os.environ["EMACS_CONFIG"] = config_path
+    # Imported only now so the config service picks up EMACS_CONFIG
+    from src.core.metrics import MissionStats
+    from src.core.orchestrator import run_mission
+    from src.tools.custom_tools import get_sandbox_pool
+
+    runs = []
+    try:
+        for scenario in scenarios:
+            for i in range(args.repeat):
+                print(f"\n🧪 [{scenario['name']}] run {i + 1}/{args.repeat}")
+                stub.load(scenario)
+                stats = MissionStats()
+                start = time.perf_counter()
+                try: result = run_mission(scenario["objective"], stats=stats)
+                except Exception as e: result = f"Crashed: {e}"
+                runs.append({
+                    "name": scenario["name"],
+                    "run": i + 1,
+                    "result": result,
+                    "wall_s": round(time.perf_counter() - start, 4),
+                    **stats.to_dict(),
+                    "peak_rss_mb": _peak_rss_mb(),
+                })
+    finally:
+        stub.stop()
+        # Containers go before the workspaces they mount
+        get_sandbox_pool().shutdown()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "runs": runs,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+
+    print("\n📊 Results:")
+    for run in runs:
+        phases = ", ".join(f"{k}={v['total_s']:.2f}s" for k, v in run["phases"].items())
+        print(f"   {run['name']}#{run['run']}: {run['result']} in {run['wall_s']:.2f}s | {phases} | attempts {run['attempts']} | RSS {run['peak_rss_mb']} MB")
+    print(f"💾 Saved {path}")
+    if args.baseline: _compare(report, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""OpenAI-compatible stub that replays scripted structured responses with configurable latency."""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Response kind is recognised from the JSON schema embedded in the prompt
+KINDS = ["Plan", "CodeOutput", "Critique", "ResearchResult", "AnalystResult"]
+
+class Script:
+    def __init__(self, scenario: dict):
+        self.responses = scenario["responses"]
+        self.latency = scenario.get("latency_s", {})
+        self.tokens_per_s = scenario.get("tokens_per_s", 200)
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def next(self, kind: str) -> str:
+        # Lists are replayed in order and the last entry repeats
+        with self._lock:
+            i = self._calls.get(kind, 0)
+            self._calls[kind] = i + 1
+        script = self.responses.get(kind)
+        if script is None: raise KeyError(f"No scripted response for {kind}")
+        if isinstance(script, list): script = script[min(i, len(script) - 1)]
+        return json.dumps(script)
+
+class StubServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.script = Script({"responses": {}})
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args): pass
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._json({"object": "list", "data": [{"id": "stub", "object": "model"}]})
+                else: self.send_error(404)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+                kind = next((k for k in KINDS if f'"title": "{k}"' in prompt), None)
+                if kind is None:
+                    self.send_error(400, "Unrecognised response model")
+                    return
+                content = stub.script.next(kind)
+                time.sleep(stub.script.latency.get(kind, stub.script.latency.get("default", 0.0)))
+                if body.get("stream"): self._stream(body.get("model", "stub"), content)
+                else: self._json(_completion(body.get("model", "stub"), content))
+
+            def _json(self, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model: str, content: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                # ~4 chars per token, paced at the scripted tokens/s
+                pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+                delay = 1.0 / stub.script.tokens_per_s
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex[:8]}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+                for piece in pieces:
+                    chunk = {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    time.sleep(delay)
+                done = {**base, "choices": [], "usage": _usage(content)}
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.base_url = f"http://{host}:{self.server.server_port}/v1"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def load(self, scenario: dict):
+        self.script = Script(scenario)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+def _usage(content: str) -> dict:
+    return {"prompt_tokens": 0, "completion_tokens": len(content) // 4 + 1, "total_tokens": len(content) // 4 + 1}
+
+def _completion(model: str, content: str) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:8]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": _usage(content),
+    }
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("scenario", help="Scenario JSON file (one scenario object)")
+    parser.add_argument("--port", type=int, default=11500)
+    args = parser.parse_args()
+    stub = StubServer(port=args.port)
+    with open(args.scenario, encoding="utf-8") as f: stub.load(json.load(f))
+    print(f"🧪 Stub LLM on {stub.base_url}")
+    stub.server.serve_forever()
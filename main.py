@@ -1,9 +1,51 @@
 import sys
 import os
-from src.core.orchestrator import run_mission
+import argparse
+
+def run_local(objective: str, resume: str = None):
+    from src.core.checkpoint import Checkpoint
+    from src.core.orchestrator import run_mission
+    os.makedirs("workspace", exist_ok=True)
+    if resume and Checkpoint.load(resume) is None: sys.exit(f"No checkpoint for mission {resume}")
+    print(run_mission(objective, mission_id=resume, resume=bool(resume)))
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2: 
+    parser = argparse.ArgumentParser(usage="python main.py 'Objective' [--local] | --resume MISSION_ID | --maintain-memory")
+    parser.add_argument("objective", nargs="?")
+    parser.add_argument("--local", action="store_true", help="Run in this process instead of the worker service")
+    parser.add_argument("--resume", metavar="MISSION_ID", help="Continue a checkpointed mission from its first unfinished step")
+    parser.add_argument("--maintain-memory", action="store_true", help="Merge, evict and prune the skill store, then rebuild the vault index")
+    if len(sys.argv) < 2:
         print("Usage: python main.py 'Objective'")
         sys.exit(1)
-    os.makedirs("workspace", exist_ok=True)
-    print(run_mission(sys.argv[1]))
+    args = parser.parse_args()
+    if args.maintain_memory:
+        from src.memory.librarian import Librarian
+        from src.memory.maintenance import maintain
+        maintain(Librarian())
+        sys.exit(0)
+    if not args.objective and not args.resume: parser.error("an objective or --resume is required")
+
+    import requests
+    from src.service.client import MissionClient
+    client = MissionClient()
+    if args.local or not client.is_alive():
+        if not args.local: print("⚠️ Worker service not reachable (python -m src.service.worker). Running locally.")
+        run_local(args.objective, args.resume)
+        sys.exit(0)
+
+    try: job = client.submit(args.objective, resume=args.resume)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        if args.resume and status == 404: sys.exit(f"No checkpoint for mission {args.resume}")
+        if args.resume and status == 409: sys.exit(f"Mission {args.resume} is already queued or running")
+        raise
+    print(f"🛰️ Submitted mission {job['id']}")
+    try:
+        for text in client.follow(job["id"]):
+            print(text, end="", flush=True)
+    except KeyboardInterrupt:
+        client.cancel(job["id"])
+        print(f"\n🛑 Cancel requested for {job['id']}")
+        sys.exit(130)
+    print(client.status(job["id"])["result"])
@@ -8,5 +8,6 @@ def analyze_failure(objective: str, context: str) -> AnalystResult:
         prompt=f"Objective: {objective}\nContext: {context}",
         model=config['models']['analyst'],
         response_model=AnalystResult,
-        system_prompt=prompts.get('analyst', "You are an analyst.")
+        system_prompt=prompts.get('analyst', "You are an analyst."),
+        agent="analyst"
     )
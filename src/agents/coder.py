@@ -10,25 +10,41 @@ def clean_markdown(text: str) -> str:
     clean = re.sub(r'\n```$', '', clean)
     return clean.strip()
 
-def write_code(instruction: str, context: str) -> CodeOutput:
+def check_partial(partial: dict):
+    """Abort rule for streamed code: small models sometimes loop on one line forever."""
+    lines = [l.strip() for l in str(partial.get("code", "")).splitlines() if l.strip()]
+    if len(lines) >= 30 and len(set(lines[-30:])) == 1:
+        return f"Degenerate repetition: '{lines[-1][:60]}'"
+    return None
+
+def write_code(instruction: str, context: str, use_cache: bool = True, abort_if=None, workspace: str = "workspace",
+               temperature: float = None, tier: int = 0, claim=None) -> CodeOutput:
     prompts = load_prompts()
     config = load_config()
     result = ask_ai(
         prompt=f"Instruction: {instruction}\nContext: {context}",
         model=config['models']['coder'],
         response_model=CodeOutput,
-        system_prompt=prompts.get('coder', "You are a coder.")
+        system_prompt=prompts.get('coder', "You are a coder."),
+        agent="coder",
+        use_cache=use_cache,
+        abort_if=abort_if,
+        temperature=temperature,
+        tier=tier,
+        hint=instruction
     )
     result.code = clean_markdown(result.code)
     
     # Filename Safety
     if not result.filename or result.filename.strip() == "" or "/" in result.filename: 
         result.filename = f"gen_{uuid.uuid4().hex[:4]}.py"
+    # claim(filename) -> the name this caller may write, so parallel steps don't overwrite each other
+    if claim: result.filename = claim(result.filename)
     
-    os.makedirs("workspace", exist_ok=True)
-    target = os.path.join("workspace", result.filename)
+    os.makedirs(workspace, exist_ok=True)
+    target = os.path.join(workspace, result.filename)
     if os.path.isdir(target): result.filename = f"script_{uuid.uuid4().hex[:4]}.py"
     
-    with open(os.path.join("workspace", result.filename), "w", encoding="utf-8") as f:
+    with open(os.path.join(workspace, result.filename), "w", encoding="utf-8") as f:
         f.write(result.code)
     return result
@@ -1,14 +1,95 @@
 from src.core.llm import ask_ai
-from src.core.models import Critique
+from src.core.models import Critique, Step
 from src.core.config import load_prompts, load_config
+from typing import Optional
+import os
 import re
 
-def review_code(filename: str, logs: str) -> Critique:
+EXIT_HEADER = re.compile(r"^Error \(Exit Code (-?\d+)\):[ \t]*(.*)$", re.MULTILINE)
+FRAME = re.compile(r'^\s*File "([^"]+)", line (\d+)')
+EXCEPTION_LINE = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning))(?::\s*(.*))?$")
+
+def parse_error(logs: str, filename: str = None) -> Optional[dict]:
+    """Pull the exception type, message and failing line out of a Python traceback.
+    Prefers the deepest frame in the generated file over library frames."""
+    lines = logs.splitlines()
+    exc = None
+    for i in range(len(lines) - 1, -1, -1):
+        m = EXCEPTION_LINE.match(lines[i])
+        if m:
+            exc = (i, m.group(1), (m.group(2) or "").strip())
+            break
+    if not exc: return None
+    end, exc_type, message = exc
+    frames = []
+    for i, line in enumerate(lines[:end]):
+        m = FRAME.match(line)
+        if not m: continue
+        source = lines[i + 1].strip() if i + 1 < end and not FRAME.match(lines[i + 1]) else ""
+        frames.append({"file": m.group(1), "line": int(m.group(2)), "source": source})
+    own = [f for f in frames if filename and os.path.basename(f["file"]) == filename]
+    frame = (own or frames or [None])[-1]
+    return {"type": exc_type.split(".")[-1], "message": message,
+            "line": frame["line"] if frame else None, "source": frame["source"] if frame else ""}
+
+def _suggest_fix(error: dict) -> str:
+    where = f" at line {error['line']}" if error["line"] else ""
+    if error["type"] in ("ModuleNotFoundError", "ImportError"):
+        module = re.search(r"No module named '([\w.]+)'", error["message"])
+        if module: return f"Add the pip package that provides '{module.group(1).split('.')[0]}' to dependencies."
+    if error["type"] in ("SyntaxError", "IndentationError", "TabError"):
+        return f"Fix the syntax{where}: {error['source'] or error['message']}"
+    if error["type"] == "NameError":
+        return f"Define or import the missing name{where}: {error['message']}"
+    if error["type"] == "FileNotFoundError":
+        return f"Create the file first or fix the path{where}: {error['message']}"
+    return f"Fix the {error['type']} raised{where}" + (f" by `{error['source']}`" if error["source"] else "") + "."
+
+LIMIT_FIXES = {
+    "Timeout": "Make the script finish quickly: avoid infinite loops, blocking input() and servers that never exit.",
+    "CPU time": "Reduce the amount of computation (smaller inputs, better algorithm).",
+    "Killed (SIGKILL)": "Use less memory: stream data instead of loading it all at once.",
+}
+
+def precheck(logs: str, filename: str = None, step: Step = None) -> Optional[Critique]:
+    """Rule-based verdict for clear-cut runs; None means the LLM critic has to decide."""
+    text = (logs or "").strip()
+    if not text or text == "(No Output)":
+        return Critique(is_passing=False, feedback="Silent Error (No Output)", suggested_fix="Add print()")
+    if text == "Sandbox Not Running":
+        return Critique(is_passing=False, feedback="Sandbox is not running, the code was not executed.")
+
+    header = EXIT_HEADER.match(text)
+    error = parse_error(text, filename)
+    if header:
+        detail = header.group(2)
+        if detail:
+            # Killed by a sandbox limit; any traceback is a side effect of the kill
+            fix = next((v for k, v in LIMIT_FIXES.items() if detail.startswith(k)), None)
+            return Critique(is_passing=False, feedback=detail, suggested_fix=fix)
+        if error:
+            where = f" at line {error['line']}" if error["line"] else ""
+            return Critique(is_passing=False, feedback=f"{error['type']}{where}: {error['message']}", suggested_fix=_suggest_fix(error))
+        last = text.splitlines()[-1].strip()
+        return Critique(is_passing=False, feedback=f"Process exited with code {header.group(1)}: {last[:200]}")
+
+    # Exit code 0 but a traceback was printed (caught and logged, or a worker thread): let the LLM judge
+    if error: return None
+    if step and step.expected_output:
+        if step.expected_output in text:
+            return Critique(is_passing=True, feedback=f"Output contains the expected '{step.expected_output}'.")
+        return Critique(is_passing=False, feedback=f"Expected output '{step.expected_output}' not found.",
+                        suggested_fix=f"Make the script print {step.expected_output!r}.")
+    return None
+
+def review_code(filename: str, logs: str, step: Step = None) -> Critique:
     prompts = load_prompts()
     config = load_config()
-    
-    if not logs or logs.strip() == "" or logs.strip() == "(No Output)":
-        return Critique(is_passing=False, feedback="Silent Error (No Output)", suggested_fix="Add print()")
+
+    verdict = precheck(logs, filename, step)
+    if verdict is not None:
+        print(f"   ⚡ Critic fast path: {'pass' if verdict.is_passing else verdict.feedback[:80]}")
+        return verdict
 
     line_hint = ""
     match = re.search(r'line (\d+)', logs)
@@ -18,5 +99,6 @@ def review_code(filename: str, logs: str) -> Critique:
         prompt=f"Logs{line_hint}:\n{logs}",
         model=config['models']['critic'],
         response_model=Critique,
-        system_prompt=prompts.get('critic', "You are a QA.")
+        system_prompt=prompts.get('critic', "You are a QA."),
+        agent="critic"
     )
@@ -15,11 +15,16 @@ def create_plan_with_tools(objective: str, context: str, tool_registry: ToolRegi
     
     To use a tool, create a step with tool_needed="tool_name" and description="argument".
     If ready to code, set tool_needed=null.
+    Set depends_on to the list of step ids whose results a step needs.
+    Use depends_on=[] for steps that are independent and can run in parallel.
+    If a coding step prints a known exact result, set expected_output to that text.
     """
     
     return ask_ai(
         prompt=f"Objective: {objective}\nContext: {context}",
         model=config['models']['planner'],
         response_model=Plan,
-        system_prompt=system_prompt
+        system_prompt=system_prompt,
+        agent="planner",
+        hint=objective
     )
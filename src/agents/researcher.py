@@ -1,7 +1,8 @@
 from src.core.llm import ask_ai
-from src.core.config import load_prompts, load_config
+from src.core.config import load_prompts, load_config, get_config
 from src.tools.research_engine.searcher import SearchEngine
 from src.tools.research_engine.scraper import WebScraper
+from src.core.tracing import traced
 from pydantic import BaseModel
 from typing import List
 
@@ -12,26 +13,35 @@ class ResearchResult(BaseModel):
 
 class Researcher:
     def __init__(self):
+        self.settings = get_config().research
         self.searcher = SearchEngine()
-        self.scraper = WebScraper()
+        self.scraper = WebScraper(timeout=self.settings.fetch_timeout_s)
         self.config = load_config()
         self.prompts = load_prompts()
 
+    @traced("research")
     def research(self, query: str) -> ResearchResult:
         print(f"🕵️ Researcher processing: {query}")
         
         # 1. Search
-        links = self.searcher.search(query, limit=3)
+        links = self.searcher.search(query, limit=self.settings.candidates)
         if not links:
             return ResearchResult(summary="No online sources found.", code_snippets=[], sources=[])
 
-        # 2. Scrape & Aggregate
+        # 2. Scrape concurrently & Aggregate (in search-rank order, not arrival order)
+        print(f"   Reading {len(links)} sources in parallel...")
+        pages = self.scraper.scrape_many(
+            [link['url'] for link in links],
+            max_workers=self.settings.max_workers,
+            deadline=self.settings.deadline_s,
+            enough_sources=self.settings.enough_sources,
+            enough_chars=self.settings.enough_chars
+        )
         context = ""
         valid_sources = []
         for link in links:
-            print(f"   Reading: {link['title']}")
-            content = self.scraper.scrape(link['url'])
-            if len(content) > 100:
+            content = pages.get(link['url'])
+            if content:
                 context += f"\n--- Source: {link['url']} ---\n{content[:5000]}\n"
                 valid_sources.append(link['url'])
 
@@ -51,5 +61,6 @@ class Researcher:
             prompt=prompt,
             model=self.config['models']['planner'], # Use smart model
             response_model=ResearchResult,
-            system_prompt=self.prompts.get('researcher', "You are a Technical Researcher.")
+            system_prompt=self.prompts.get('researcher', "You are a Technical Researcher."),
+            agent="researcher"
         )
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""Pool of OpenAI-compatible LLM endpoints: least-outstanding balancing, per-endpoint caps, circuit breaking."""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+import requests
+from openai import APIConnectionError, APITimeoutError, InternalServerError, OpenAI
+from src.core.config import get_config
+
+# Errors that say "this endpoint is in trouble" rather than "the answer was bad"
+BACKEND_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError)
+
+class NoBackendAvailable(Exception):
+    pass
+
+class Backend:
+    def __init__(self, name: str, base_url: str, api_key: str = "ollama", max_concurrency: int = 2,
+                 models: Sequence[str] = (), timeout: float = 300, client_retries: int = 2):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.models = set(models)
+        # Timeout 300s (5 mins) by default to prevent hanging on CPU/Slow GPU.
+        # Plain client: structured output is parsed and repaired in llm.ask_ai
+        self.raw = OpenAI(base_url=base_url, api_key=api_key, timeout=timeout, max_retries=client_retries)
+        self.outstanding = 0
+        self.waiting = 0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None # Circuit open since; None = closed
+        self.latencies = deque(maxlen=100)
+
+    def serves(self, model: str) -> bool:
+        return not self.models or model in self.models
+
+    @property
+    def circuit_open(self) -> bool:
+        return self.opened_at is not None
+
+    def stats(self) -> dict:
+        lat = sorted(self.latencies)
+        return {
+            "outstanding": self.outstanding,
+            "queued": self.waiting,
+            "calls": self.calls,
+            "failures": self.failures,
+            "circuit": "open" if self.circuit_open else "closed",
+            "avg_latency_s": round(sum(lat) / len(lat), 2) if lat else None,
+            "p95_latency_s": round(lat[int(len(lat) * 0.95) - 1 if len(lat) > 1 else 0], 2) if lat else None,
+        }
+
+class BackendPool:
+    def __init__(self, backends: List[Backend], failure_threshold: int = 3, cooldown_s: float = 30,
+                 health_interval_s: float = 10, acquire_timeout_s: float = 600):
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.acquire_timeout_s = acquire_timeout_s
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        if len(backends) > 1 and health_interval_s:
+            threading.Thread(target=self._health_loop, args=(health_interval_s,), daemon=True).start()
+
+    def _candidates(self, model: str, exclude: Sequence[str]) -> List[Backend]:
+        serving = [b for b in self.backends if b.serves(model) and b.name not in exclude]
+        now = time.time()
+        closed = [b for b in serving if not b.circuit_open]
+        # Open circuits past their cooldown get a half-open trial; with nothing else left, use them anyway
+        return closed or [b for b in serving if now - b.opened_at >= self.cooldown_s] or serving
+
+    def has_alternative(self, model: str, exclude: Sequence[str]) -> bool:
+        return any(b.serves(model) and b.name not in exclude for b in self.backends)
+
+    def acquire(self, model: str, exclude: Sequence[str] = ()) -> Backend:
+        """Least outstanding requests (relative to each endpoint's cap); waits while every endpoint is full."""
+        deadline = time.time() + self.acquire_timeout_s
+        with self._cond:
+            candidates = self._candidates(model, exclude)
+            if not candidates: raise NoBackendAvailable(f"No LLM backend serves '{model}'")
+            for b in candidates: b.waiting += 1
+            try:
+                while True:
+                    free = [b for b in self._candidates(model, exclude) if b.outstanding < b.max_concurrency]
+                    if free: break
+                    remaining = deadline - time.time()
+                    if remaining <= 0: raise NoBackendAvailable(f"All LLM backends for '{model}' are busy")
+                    self._cond.wait(remaining)
+            finally:
+                for b in candidates: b.waiting -= 1
+            backend = min(free, key=lambda b: (b.outstanding / b.max_concurrency, b.stats()["avg_latency_s"] or 0))
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend: Backend, latency: float, error: Optional[BaseException] = None):
+        with self._cond:
+            backend.outstanding -= 1
+            backend.calls += 1
+            if isinstance(error, BACKEND_ERRORS): self._failed(backend)
+            else:
+                backend.latencies.append(latency)
+                backend.consecutive_failures = 0
+                if backend.circuit_open:
+                    print(f"🟢 LLM backend {backend.name} recovered")
+                    backend.opened_at = None
+            self._cond.notify_all()
+
+    def _failed(self, backend: Backend):
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.failure_threshold or backend.circuit_open:
+            if not backend.circuit_open: print(f"🔴 LLM backend {backend.name} circuit opened")
+            backend.opened_at = time.time()
+
+    def close(self):
+        self._closed.set()
+
+    def _health_loop(self, interval: float):
+        while not self._closed.wait(interval):
+            for b in self.backends:
+                try: ok = requests.get(f"{b.base_url}/models", timeout=5).status_code < 500
+                except requests.RequestException: ok = False
+                with self._cond:
+                    if ok and b.circuit_open and time.time() - b.opened_at >= self.cooldown_s:
+                        print(f"🟢 LLM backend {b.name} healthy again")
+                        b.opened_at, b.consecutive_failures = None, 0
+                        self._cond.notify_all()
+                    elif not ok and not b.circuit_open:
+                        print(f"🔴 LLM backend {b.name} failed its health check")
+                        b.opened_at = time.time()
+
+    def stats(self) -> Dict[str, dict]:
+        with self._cond: return {b.name: b.stats() for b in self.backends}
+
+_pool: Optional[BackendPool] = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+def get_backend_pool() -> BackendPool:
+    """Pool for the configured endpoints, rebuilt only when the endpoint config changes."""
+    global _pool, _pool_key
+    settings = get_config()
+    pool_settings = settings.llm_backends
+    endpoints = [e.model_dump() for e in pool_settings.endpoints] or [{"name": "default", "base_url": settings.llm_base_url}]
+    key = (repr(endpoints), settings.llm_timeout_s, repr(pool_settings.model_dump()))
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool: _pool.close()
+            # With somewhere to fail over to, the client's own retries would only delay it
+            client_retries = 2 if len(endpoints) == 1 else 0
+            backends = [Backend(e.get("name") or e["base_url"], e["base_url"], e.get("api_key", "ollama"),
+                                e.get("max_concurrency") or pool_settings.max_concurrency, e.get("models", []),
+                                settings.llm_timeout_s, client_retries) for e in endpoints]
+            _pool = BackendPool(backends, pool_settings.failure_threshold, pool_settings.cooldown_s,
+                                pool_settings.health_interval_s, pool_settings.acquire_timeout_s)
+            _pool_key = key
+        return _pool
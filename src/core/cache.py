@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+class DiskCache:
+    """SQLite-backed key/value store with age and size based eviction."""
+    def __init__(self, path: str, max_entries: int = 2000, max_bytes: int = 256 * 1024 * 1024, max_age: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_entry(self, key: str):
+        """Return (value, created_at) regardless of age, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row: return None
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(row[0]), row[1]
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        entry = self.get_entry(key)
+        max_age = max_age if max_age is not None else self.max_age
+        if entry is None or (max_age is not None and time.time() - entry[1] > max_age):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def set(self, key: str, value: Any):
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            self._db.commit()
+            self.stats["writes"] += 1
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _evict(self):
+        # Expired first, then least recently used until within entry/byte limits
+        removed = 0
+        if self.max_age is not None:
+            removed += self._db.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.max_age,)).rowcount
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count > self.max_entries or total > self.max_bytes:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall()
+            doomed = []
+            for key, size in rows:
+                if count <= self.max_entries and total <= self.max_bytes: break
+                doomed.append((key,))
+                count -= 1
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            removed += len(doomed)
+        if removed:
+            self._db.commit()
+            self.stats["evictions"] += removed
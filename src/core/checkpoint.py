@@ -0,0 +1,122 @@
+"""Mission checkpoints: plan, per-step results, dependencies and workspace files, saved after every step."""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from src.core.config import get_config, resolve_path
+from src.core.context import ContextItem
+from src.core.models import Plan
+from src.core.sandbox import copy_changed, snapshot_dir
+
+class StepRecord(BaseModel):
+    status: str = "pending" # pending | done | failed
+    items: List[ContextItem] = []
+    filename: Optional[str] = None
+    finished_at: Optional[float] = None
+
+class MissionState(BaseModel):
+    id: str
+    objective: str
+    status: str = "running" # running | done | failed | cancelled
+    created_at: float
+    updated_at: float
+    plan: Optional[Plan] = None
+    context: List[ContextItem] = [] # What the mission started from (recalled knowledge)
+    recalled: List[str] = [] # Skill ids recalled into the context; they get the mission's outcome
+    outcome_recorded: bool = False # Set once the recalled skills got it, so a resume doesn't credit them again
+    steps: Dict[int, StepRecord] = {}
+    dependencies: List[str] = []
+
+def _atomic_write(path: str, data: str):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".state_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+class Checkpoint:
+    """One mission's progress under checkpoints/<id>/: state.json plus a copy of the workspace."""
+    def __init__(self, state: MissionState, root: str = None):
+        settings = get_config().checkpoint
+        self.state = state
+        self.enabled = settings.enabled
+        self.dir = os.path.join(resolve_path(root or settings.dir), state.id)
+        self.workspace = os.path.join(self.dir, "workspace")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, objective: str, mission_id: str = None, root: str = None) -> "Checkpoint":
+        now = time.time()
+        ckpt = cls(MissionState(id=mission_id or uuid.uuid4().hex[:12], objective=objective, created_at=now, updated_at=now), root)
+        ckpt.save()
+        return ckpt
+
+    @classmethod
+    def load(cls, mission_id: str, root: str = None) -> Optional["Checkpoint"]:
+        path = os.path.join(resolve_path(root or get_config().checkpoint.dir), mission_id, "state.json")
+        try:
+            with open(path, encoding="utf-8") as f: return cls(MissionState.model_validate_json(f.read()), root)
+        except (OSError, ValueError): return None
+
+    def save(self):
+        if not self.enabled: return
+        os.makedirs(self.dir, exist_ok=True)
+        self.state.updated_at = time.time()
+        _atomic_write(os.path.join(self.dir, "state.json"), self.state.model_dump_json(indent=2))
+
+    def is_done(self, step_id: int) -> bool:
+        record = self.state.steps.get(step_id)
+        return bool(record and record.status == "done")
+
+    def completed_items(self) -> List[ContextItem]:
+        """Context produced by finished steps, in plan order."""
+        if not self.state.plan: return []
+        return [item for s in self.state.plan.steps if self.is_done(s.id) for item in self.state.steps[s.id].items]
+
+    def record_plan(self, plan: Plan, context: List[ContextItem], recalled: List[str] = ()):
+        with self._lock:
+            self.state.plan = plan
+            self.state.context = list(context)
+            self.state.recalled = list(recalled)
+            self.state.steps = {s.id: StepRecord() for s in plan.steps}
+            self.save()
+
+    def record_step(self, step_id: int, ok: bool, items: List[ContextItem], filename: str = None, workspace: str = None):
+        with self._lock:
+            if ok and workspace and self.enabled:
+                # Incremental: copy2 keeps mtimes, so unchanged files compare equal
+                os.makedirs(self.workspace, exist_ok=True)
+                copy_changed(workspace, self.workspace, snapshot_dir(self.workspace))
+            self.state.steps[step_id] = StepRecord(status="done" if ok else "failed", items=list(items),
+                                                   filename=filename, finished_at=time.time())
+            self.save()
+
+    def record_dependencies(self, dependencies: List[str]):
+        with self._lock:
+            self.state.dependencies = list(dependencies)
+            self.save()
+
+    def finish(self, status: str):
+        with self._lock:
+            self.state.status = status
+            self.save()
+
+    def claim_outcome(self) -> bool:
+        """True the first time only: whether this run should credit the recalled skills with the outcome."""
+        with self._lock:
+            if self.state.outcome_recorded: return False
+            self.state.outcome_recorded = True
+            self.save()
+            return True
+
+    def restore_workspace(self, target: str):
+        if os.path.isdir(self.workspace): shutil.copytree(self.workspace, target, dirs_exist_ok=True)
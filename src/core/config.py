@@ -1,13 +1,205 @@
 import yaml
 import json
 import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from pydantic import BaseModel, ConfigDict
 from dotenv import load_dotenv
 
-load_dotenv()
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+# EMACS_CONFIG points a process at an alternative genome (e.g. the offline benchmark)
+CONFIG_PATH = Path(os.environ.get("EMACS_CONFIG") or PROJECT_ROOT / "genome_config.json")
+PROMPTS_PATH = PROJECT_ROOT / "src" / "config" / "prompts.yaml"
 
-def load_config():
-    if not os.path.exists("genome_config.json"): return {}
-    with open("genome_config.json") as f: return json.load(f)
-def load_prompts():
-    if not os.path.exists("src/config/prompts.yaml"): return {}
-    with open("src/config/prompts.yaml") as f: return yaml.safe_load(f)
+load_dotenv(PROJECT_ROOT / ".env")
+
+class LLMCacheConfig(BaseModel):
+    enabled: bool = True
+    path: str = "./.emacs_cache/llm.sqlite"
+    max_entries: int = 2000
+    max_mb: int = 256
+    max_age_hours: Optional[float] = 168
+    bypass_agents: List[str] = []
+
+class StreamingConfig(BaseModel):
+    enabled: bool = False
+    agents: List[str] = []
+
+class SandboxConfig(BaseModel):
+    pool_size: int = 2
+    max_uses: int = 20
+    workspace_root: str = "./sandboxes"
+    publish_dir: str = "./workspace" # Shared workspace the UI shows; passing steps are copied here
+    wheel_cache: str = "./.emacs_cache/pip"
+    image_cache: bool = True
+    max_cached_images: int = 20 # Newest emacs-deps:* images kept; older ones are pruned
+    exec_timeout_s: float = 60
+    cpu_limit_s: int = 60
+    output_head_kb: int = 16
+    output_tail_kb: int = 16
+    stream_output: bool = True
+    stream_max_lines: int = 200
+
+class SpeculativeConfig(BaseModel):
+    enabled: bool = False
+    candidates: int = 3
+    temperature: float = 0.8
+
+class ContextBudgetConfig(BaseModel):
+    default: int = 3000
+    models: Dict[str, int] = {}
+
+class ResearchConfig(BaseModel):
+    candidates: int = 5
+    max_workers: int = 4
+    fetch_timeout_s: float = 8
+    deadline_s: float = 20
+    enough_sources: int = 3
+    enough_chars: int = 12000
+
+class HttpCacheConfig(BaseModel):
+    enabled: bool = True
+    path: str = "./.emacs_cache/http.sqlite"
+    ttl_hours: float = 24
+    search_ttl_hours: float = 6
+    max_entries: int = 5000
+    max_mb: int = 512
+
+class TracingConfig(BaseModel):
+    enabled: bool = True
+    jsonl_path: str = "./traces/spans.jsonl"
+    langfuse_enabled: bool = False
+    langfuse_host: str = "http://localhost:3000"
+
+class ServiceConfig(BaseModel):
+    host: str = "127.0.0.1"
+    port: int = 8765
+    max_concurrency: int = 2
+    log_dir: str = "./logs/missions"
+
+class MCPServerConfig(BaseModel):
+    command: str
+    args: List[str] = []
+    env: Dict[str, str] = {}
+
+class MCPConfig(BaseModel):
+    connect_timeout_s: float = 30
+    call_timeout_s: float = 60
+    # name -> server; "{workspace}" in args is replaced with the mission's sandbox directory
+    servers: Dict[str, MCPServerConfig] = {}
+
+class RoutingConfig(BaseModel):
+    enabled: bool = False
+    ladders: Dict[str, List[str]] = {} # agent -> models, fastest first
+    retries_per_tier: int = 1 # Validation retries before escalating (the top tier keeps 3)
+    complex_chars: int = 400
+    complex_keywords: List[str] = ["async", "thread", "concurren", "database", "scrap", "parse", "optimi", "gui", "server"]
+    min_samples: int = 5
+    min_success_rate: float = 0.3
+    window: int = 20
+    probe_every: int = 10
+
+class LLMEndpointConfig(BaseModel):
+    base_url: str
+    name: str = ""
+    api_key: str = "ollama"
+    max_concurrency: Optional[int] = None
+    models: List[str] = [] # Empty = serves every model
+
+class LLMBackendsConfig(BaseModel):
+    endpoints: List[LLMEndpointConfig] = [] # Empty = just llm_base_url
+    max_concurrency: int = 4 # Per endpoint, unless the endpoint sets its own
+    failure_threshold: int = 3
+    cooldown_s: float = 30
+    health_interval_s: float = 10
+    acquire_timeout_s: float = 600
+
+class MemoryConfig(BaseModel):
+    chroma_path: str = "./chroma_db"
+    capacity: int = 500 # Skills kept after maintenance; the least useful go first
+    merge_similarity: float = 0.95 # Cosine similarity above which two skills are merged
+    stale_days: float = 30 # Not recalled for this long = stale
+    min_recalls: int = 3 # Recalled this often without a single pass = never useful
+    maintain_on_start: bool = True # Worker runs maintenance once at warm-up
+    reuse_enabled: bool = True # Run a stored skill as is when a step repeats its objective
+    reuse_similarity: float = 0.92 # Cosine similarity between the step and the skill's stored objective
+
+class CheckpointConfig(BaseModel):
+    enabled: bool = True
+    dir: str = "./checkpoints"
+
+class GenomeConfig(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    system_name: str = "EMACS"
+    version: str = ""
+    obsidian_vault_path: str = "./memory_logs"
+    max_attempts_per_step: int = 3
+    max_parallel_steps: int = 3
+    models: Dict[str, str] = {}
+    llm_base_url: str = "http://localhost:11434/v1"
+    llm_timeout_s: float = 300
+    docker_image: str = "python:3.10-slim"
+    llm_cache: LLMCacheConfig = LLMCacheConfig()
+    llm_streaming: StreamingConfig = StreamingConfig()
+    sandbox: SandboxConfig = SandboxConfig()
+    speculative: SpeculativeConfig = SpeculativeConfig()
+    context_budget: ContextBudgetConfig = ContextBudgetConfig()
+    research: ResearchConfig = ResearchConfig()
+    http_cache: HttpCacheConfig = HttpCacheConfig()
+    tracing: TracingConfig = TracingConfig()
+    service: ServiceConfig = ServiceConfig()
+    checkpoint: CheckpointConfig = CheckpointConfig()
+    mcp: MCPConfig = MCPConfig()
+    routing: RoutingConfig = RoutingConfig()
+    llm_backends: LLMBackendsConfig = LLMBackendsConfig()
+    memory: MemoryConfig = MemoryConfig()
+
+def resolve_path(path: str) -> str:
+    """Resolve a config path against the project root instead of the CWD."""
+    return str(Path(path) if os.path.isabs(path) else (PROJECT_ROOT / path).resolve())
+
+class _WatchedFile:
+    """Parses a file once and re-parses only when its mtime changes."""
+    def __init__(self, path: Path, parse: Callable[[str], Any], default: Any):
+        self.path = path
+        self._parse = parse
+        self._default = default
+        self._value = default
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        try: mtime = os.stat(self.path).st_mtime
+        except OSError: mtime = None
+        if mtime == self._mtime: return self._value
+        with self._lock:
+            if mtime != self._mtime:
+                if mtime is None:
+                    self._value = self._default
+                else:
+                    try:
+                        with open(self.path, encoding="utf-8") as f: self._value = self._parse(f.read())
+                    except Exception as e:
+                        # Keep serving the last good version while the file is mid-edit
+                        print(f"⚠️ Config reload failed for {self.path.name}: {e}")
+                        return self._value
+                self._mtime = mtime
+        return self._value
+
+def _parse_config(text: str):
+    typed = GenomeConfig.model_validate(json.loads(text))
+    return typed, typed.model_dump()
+
+_config = _WatchedFile(CONFIG_PATH, _parse_config, (GenomeConfig(), GenomeConfig().model_dump()))
+_prompts = _WatchedFile(PROMPTS_PATH, lambda text: yaml.safe_load(text) or {}, {})
+
+def get_config() -> GenomeConfig:
+    return _config.get()[0]
+
+def load_config() -> dict:
+    # Shared across callers: treat as read-only
+    return _config.get()[1]
+
+def load_prompts() -> dict:
+    return _prompts.get()
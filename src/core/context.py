@@ -0,0 +1,94 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel
+from src.core.config import get_config
+
+SECTIONS = {
+    "knowledge": "Recalled Knowledge",
+    "tool_result": "Tool Results",
+    "step_done": "Completed Steps",
+    "attempt_log": "Previous Attempts",
+}
+# Failures of the current step matter most, then what earlier steps produced
+KIND_WEIGHT = {"attempt_log": 3.0, "step_done": 2.0, "tool_result": 1.0, "knowledge": 0.8}
+
+class ContextItem(BaseModel):
+    kind: str
+    text: str
+    step_id: Optional[int] = None
+    seq: int = 0
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+def _terms(text: str) -> set:
+    return {w for w in re.findall(r"[a-z0-9_]+", text.lower()) if len(w) > 2}
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Keep the head and tail (tracebacks and summaries live at the ends); the result fits max_tokens."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars: return text
+    # Room for the "... [N chars omitted] ..." marker, so the trimmed text still fits instead of being dropped
+    keep = max(max_chars - 40, 0)
+    head = keep * 2 // 3
+    tail = keep - head
+    return f"{text[:head]}\n... [{len(text) - keep} chars omitted] ...\n{text[len(text) - tail:]}"
+
+def budget_for(model: str) -> int:
+    settings = get_config().context_budget
+    return settings.models.get(model, settings.default)
+
+class ContextBuilder:
+    def __init__(self, items: Iterable[ContextItem] = ()):
+        self.items: List[ContextItem] = list(items)
+
+    def add(self, kind: str, text: str, step_id: Optional[int] = None) -> ContextItem:
+        item = ContextItem(kind=kind, text=text, step_id=step_id, seq=len(self.items))
+        if text.strip(): self.items.append(item)
+        return item
+
+    def extend(self, items: Iterable[ContextItem]):
+        for item in items: self.add(item.kind, item.text, item.step_id)
+
+    def copy(self) -> "ContextBuilder":
+        return ContextBuilder(self.items)
+
+    def build(self, query: str, budget: int) -> Tuple[str, Dict[str, int]]:
+        """Rank items against the query, fit them into `budget` tokens and report usage per section."""
+        if not self.items: return "", {"total": 0, "budget": budget, "dropped": 0}
+        query_terms = _terms(query)
+        last_seq = max(i.seq for i in self.items) or 1
+
+        def score(item: ContextItem) -> float:
+            overlap = len(_terms(item.text) & query_terms) / len(query_terms) if query_terms else 0.0
+            return KIND_WEIGHT.get(item.kind, 1.0) + 2.0 * overlap + 0.5 * item.seq / last_seq
+
+        # No single scraped page may take the whole budget
+        per_item_cap = max(budget // 3, 200)
+        remaining = budget
+        chosen: List[Tuple[ContextItem, str]] = []
+        dropped = 0
+        for item in sorted(self.items, key=score, reverse=True):
+            text = truncate(item.text, min(per_item_cap, remaining))
+            cost = estimate_tokens(text)
+            if remaining < 64 or cost > remaining:
+                dropped += 1
+                continue
+            chosen.append((item, text))
+            remaining -= cost
+
+        report: Dict[str, int] = {}
+        parts = []
+        for kind, title in SECTIONS.items():
+            section = sorted((c for c in chosen if c[0].kind == kind), key=lambda c: c[0].seq)
+            if not section: continue
+            body = "\n".join(text for _, text in section)
+            report[kind] = estimate_tokens(body)
+            parts.append(f"## {title}\n{body}")
+        report.update(total=budget - remaining, budget=budget, dropped=dropped)
+        return "\n\n".join(parts), report
+
+def format_report(report: Dict[str, int]) -> str:
+    sections = " ".join(f"{k}={v}" for k, v in report.items() if k in SECTIONS)
+    return f"{sections} (total {report['total']}/{report['budget']} tokens, dropped {report['dropped']})"
@@ -1,22 +1,316 @@
-import instructor
-from openai import OpenAI
-from pydantic import BaseModel
-from typing import Type, TypeVar
-
-# Timeout 300s (5 mins) to prevent hanging on CPU/Slow GPU
-client = instructor.patch(
-    OpenAI(base_url="http://localhost:11434/v1", api_key="ollama", timeout=300.0), 
-    mode=instructor.Mode.JSON
-)
+import json
+import threading
+import time
+from pydantic import BaseModel, ValidationError
+from typing import Callable, Optional, Type, TypeVar
+from src.core.backends import BACKEND_ERRORS, Backend, get_backend_pool
+from src.core.cache import DiskCache
+from src.core.config import get_config, load_config, resolve_path
+from src.core.repair import repair
+from src.core.router import get_router
+from src.core.tracing import span, current_span
+
 T = TypeVar("T", bound=BaseModel)
-def ask_ai(prompt: str, model: str, response_model: Type[T], system_prompt: str) -> T:
+
+class StreamAborted(Exception):
+    """Raised when a partial response is already known to be unusable."""
+
+_cache: Optional[DiskCache] = None
+
+def get_cache() -> Optional[DiskCache]:
+    global _cache
+    settings = load_config().get("llm_cache", {})
+    if not settings.get("enabled", True): return None
+    if _cache is None:
+        max_age_hours = settings.get("max_age_hours", 168)
+        _cache = DiskCache(
+            resolve_path(settings.get("path", "./.emacs_cache/llm.sqlite")),
+            max_entries=settings.get("max_entries", 2000),
+            max_bytes=settings.get("max_mb", 256) * 1024 * 1024,
+            max_age=max_age_hours * 3600 if max_age_hours else None
+        )
+    return _cache
+
+def cache_stats() -> dict:
+    return dict(_cache.stats) if _cache else {}
+
+# --- Per-agent latency metrics ---
+_metrics: dict = {}
+_metrics_lock = threading.Lock()
+
+def _new_metrics() -> dict:
+    return {"calls": 0, "aborted": 0, "tokens": 0, "total_latency": 0.0, "ttft": [],
+            "retries": 0, "repaired": 0, "repair_failed": 0, "fixes": {}}
+
+def _record(agent: str, latency: float, tokens: int = 0, ttft: Optional[float] = None, aborted: bool = False):
+    with _metrics_lock:
+        m = _metrics.setdefault(agent or "unknown", _new_metrics())
+        m["calls"] += 1
+        m["aborted"] += int(aborted)
+        m["tokens"] += tokens
+        m["total_latency"] += latency
+        if ttft is not None: m["ttft"].append(ttft)
+
+def _record_retry(agent: str):
+    with _metrics_lock: _metrics.setdefault(agent or "unknown", _new_metrics())["retries"] += 1
+
+def _record_repair(agent: str, fixes: list, ok: bool):
+    with _metrics_lock:
+        m = _metrics.setdefault(agent or "unknown", _new_metrics())
+        m["repaired" if ok else "repair_failed"] += 1
+        for fix in fixes: m["fixes"][fix] = m["fixes"].get(fix, 0) + 1
+
+def llm_stats() -> dict:
+    """Per-agent calls, avg latency, avg time-to-first-token, tokens/s, and retries vs local repairs."""
+    out = {}
+    with _metrics_lock:
+        for agent, m in _metrics.items():
+            out[agent] = {
+                "calls": m["calls"],
+                "aborted": m["aborted"],
+                "avg_latency_s": round(m["total_latency"] / m["calls"], 2) if m["calls"] else None,
+                "avg_ttft_s": round(sum(m["ttft"]) / len(m["ttft"]), 2) if m["ttft"] else None,
+                "tokens_per_s": round(m["tokens"] / m["total_latency"], 1) if m["total_latency"] and m["tokens"] else None,
+                "retries": m["retries"],
+                # Every call after the first of a request is a retry
+                "retry_rate": round(m["retries"] / m["calls"], 2) if m["calls"] else None,
+                "repaired": m["repaired"],
+                "repair_failed": m["repair_failed"],
+            }
+    return out
+
+def repair_stats() -> dict:
+    """Per-agent count of each local fix applied (fences, prose, newlines, coerced, ...)."""
+    with _metrics_lock: return {agent: dict(m["fixes"]) for agent, m in _metrics.items() if m["fixes"]}
+
+# --- Streaming ---
+def parse_partial_json(text: str) -> Optional[dict]:
+    """Best-effort parse of an unfinished JSON object by closing open strings/brackets."""
+    start = text.find("{")
+    if start < 0: return None
+    text = text[start:]
+    stack, in_str, escape = [], False, False
+    last_sep, sep_stack = 0, []
+    for i, ch in enumerate(text):
+        if in_str:
+            if escape: escape = False
+            elif ch == "\\": escape = True
+            elif ch == '"': in_str = False
+        elif ch == '"': in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            last_sep, sep_stack = i + 1, list(stack)
+        elif ch in "}]" and stack: stack.pop()
+        elif ch == ",": last_sep, sep_stack = i, list(stack)
+    body = (text[:-1] if escape else text) + ('"' if in_str else "")
+    try: return json.loads(body + "".join(reversed(stack)))
+    except json.JSONDecodeError: pass
+    # Dangling key or half-written value: cut back to the last structural separator
+    try: return json.loads(text[:last_sep] + "".join(reversed(sep_stack)))
+    except json.JSONDecodeError: return None
+
+def schema_abort_check(response_model: Type[BaseModel]) -> Callable[[str, Optional[dict]], Optional[str]]:
+    """Generic early-abort rule: prose instead of JSON, or keys the schema does not have."""
+    fields = set(response_model.model_fields)
+    def check(text: str, partial: Optional[dict]) -> Optional[str]:
+        stripped = text.lstrip()
+        if len(stripped) > 300 and "{" not in stripped[:300]:
+            return "Response is prose, not JSON"
+        if partial:
+            unknown = set(partial) - fields
+            if unknown: return f"Unknown fields {sorted(unknown)}"
+        return None
+    return check
+
+def log_progress(agent: str, every: float = 2.0) -> Callable[[dict], None]:
+    """Default sink: periodically prints the size of the longest growing field."""
+    last = [0.0]
+    def sink(partial: dict):
+        now = time.time()
+        if now - last[0] < every: return
+        last[0] = now
+        sizes = {k: len(v) for k, v in partial.items() if isinstance(v, str)}
+        if not sizes: return
+        field = max(sizes, key=sizes.get)
+        lines = partial[field].count("\n") + 1
+        print(f"   ✍️ {agent}: {field} {sizes[field]} chars / {lines} lines")
+    return sink
+
+def _stream_once(client, model: str, messages: list, agent: str, temperature: Optional[float],
+                 check: Callable[[str, Optional[dict]], Optional[str]],
+                 on_partial: Optional[Callable[[dict], None]]) -> str:
+    s = current_span()
+    start = time.time()
+    ttft, tokens, usage_tokens, text = None, 0, None, ""
+    partial, last_parse = None, 0.0
     try:
-        return client.chat.completions.create(
-            model=model,
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
-            response_model=response_model,
-            max_retries=3
+        stream = client.chat.completions.create(
+            model=model, messages=messages, stream=True,
+            response_format={"type": "json_object"},
+            stream_options={"include_usage": True},
+            **({"temperature": temperature} if temperature is not None else {})
         )
-    except Exception as e:
-        print(f"❌ LLM Error: {e}")
-        raise e
+        for chunk in stream:
+            if getattr(chunk, "usage", None): usage_tokens = chunk.usage.completion_tokens
+            if not chunk.choices: continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta: continue
+            if ttft is None: ttft = time.time() - start
+            tokens += 1
+            text += delta
+            # Re-parsing the whole buffer is O(n), so only do it a few times per second
+            now = time.time()
+            if now - last_parse < 0.25 and partial is not None: continue
+            last_parse = now
+            partial = parse_partial_json(text) or partial
+            reason = check(text, partial)
+            if reason:
+                stream.close()
+                raise StreamAborted(reason)
+            if on_partial and partial: on_partial(partial)
+    except StreamAborted as e:
+        _record(agent, time.time() - start, usage_tokens or tokens, ttft, aborted=True)
+        print(f"   🛑 {agent or model} aborted early: {e}")
+        raise
+    _record(agent, time.time() - start, usage_tokens or tokens, ttft)
+    if s: s.set(completion_tokens=usage_tokens or tokens, ttft_s=round(ttft, 3) if ttft else None)
+    return text
+
+def _complete_once(client, model: str, messages: list, agent: str, temperature: Optional[float]) -> str:
+    s = current_span()
+    start = time.time()
+    response = client.chat.completions.create(
+        model=model, messages=messages,
+        response_format={"type": "json_object"},
+        **({"temperature": temperature} if temperature is not None else {})
+    )
+    usage = response.usage
+    _record(agent, time.time() - start, usage.completion_tokens if usage else 0)
+    if s: s.set(prompt_tokens=usage.prompt_tokens if usage else None, completion_tokens=usage.completion_tokens if usage else None)
+    return response.choices[0].message.content or ""
+
+def _parse_or_repair(text: str, response_model: Type[T], agent: str) -> T:
+    try:
+        return response_model.model_validate_json(text[text.find("{"):text.rfind("}") + 1])
+    except ValidationError as e:
+        result, fixes = repair(text, response_model)
+        _record_repair(agent, fixes, result is not None)
+        if result is None: raise e
+        print(f"   🩹 {agent or response_model.__name__}: repaired output locally ({', '.join(fixes)})")
+        return result
+
+def _request_structured(client, model: str, messages: list, response_model: Type[T], agent: str, stream: bool,
+                        on_partial: Optional[Callable[[dict], None]],
+                        abort_if: Optional[Callable[[dict], Optional[str]]],
+                        max_retries: int = 3, temperature: Optional[float] = None) -> T:
+    """JSON-mode request with the schema in the system prompt. Output that fails validation is repaired
+    locally first; only what repair can't save is re-asked, with the validation errors."""
+    schema = json.dumps(response_model.model_json_schema(), indent=2)
+    messages = [
+        {"role": "system", "content": f"{messages[0]['content']}\n\nRespond ONLY with a JSON object matching this json_schema:\n{schema}\nReturn an instance of the schema, not the schema itself."},
+        *messages[1:]
+    ]
+    generic_check = schema_abort_check(response_model)
+    check = lambda text, partial: generic_check(text, partial) or (abort_if(partial) if abort_if and partial else None)
+    last_error = None
+    s = current_span()
+    for attempt in range(max_retries):
+        if s: s.set(retries=attempt)
+        if attempt: _record_retry(agent)
+        if stream: text = _stream_once(client, model, messages, agent, temperature, check, on_partial)
+        else: text = _complete_once(client, model, messages, agent, temperature)
+        try:
+            return _parse_or_repair(text, response_model, agent)
+        except ValidationError as e:
+            last_error = e
+            messages = messages + [
+                {"role": "assistant", "content": text},
+                {"role": "user", "content": f"Recall the function correctly, fix the errors:\n{e}"}
+            ]
+    raise last_error
+
+def _streaming_enabled(agent: str) -> bool:
+    settings = load_config().get("llm_streaming", {})
+    return settings.get("enabled", False) and agent in settings.get("agents", [])
+
+def ask_ai(prompt: str, model: str, response_model: Type[T], system_prompt: str, agent: str = "", use_cache: bool = True,
+           stream: Optional[bool] = None, on_partial: Optional[Callable[[dict], None]] = None,
+           abort_if: Optional[Callable[[dict], Optional[str]]] = None, temperature: Optional[float] = None,
+           tier: int = 0, hint: str = "") -> T:
+    """`model` is the agent's configured model; with routing enabled the agent's ladder is walked instead,
+    starting at `tier` (bumped when `hint` looks complex) and escalating when a tier fails validation."""
+    with span("llm.ask", agent=agent, model=model, response_model=response_model.__name__,
+              prompt_chars=len(system_prompt) + len(prompt), temperature=temperature) as s:
+        # Sampled calls are meant to differ, so they are never replayed or stored
+        cache = get_cache() if use_cache and temperature is None and agent not in load_config().get("llm_cache", {}).get("bypass_agents", []) else None
+        key = None
+        if cache:
+            key = DiskCache.make_key(model, system_prompt, prompt, response_model.model_json_schema())
+            hit = cache.get(key)
+            if hit is not None:
+                try:
+                    result = response_model.model_validate(hit)
+                    print(f"⚡ LLM Cache Hit ({agent or model})")
+                    s.set(cache_hit=True)
+                    get_router().forget_last(agent)
+                    return result
+                except Exception: cache.delete(key)
+        if stream is None: stream = _streaming_enabled(agent) or on_partial is not None
+        s.set(cache_hit=False, streaming=stream)
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}]
+        router = get_router()
+        models = router.route(agent, model, tier, hint)
+        for i, routed in enumerate(models):
+            top = i == len(models) - 1
+            start = time.time()
+            try:
+                result = _call_model(routed, messages, response_model, agent, stream, on_partial, abort_if, temperature,
+                                     retries=3 if top else get_config().routing.retries_per_tier)
+            except StreamAborted:
+                router.record(agent, routed, False, time.time() - start)
+                raise
+            except Exception as e:
+                router.record(agent, routed, False, time.time() - start)
+                if top:
+                    print(f"❌ LLM Error: {e}")
+                    raise e
+                print(f"   ⤴️ {agent}: {routed} failed ({type(e).__name__}), escalating to {models[i + 1]}")
+                continue
+            router.record(agent, routed, True, time.time() - start)
+            s.set(model=routed, escalations=i)
+            break
+        s.set(response_chars=len(result.model_dump_json()))
+        if cache: cache.set(key, result.model_dump(mode="json"))
+        return result
+
+def _call_model(model: str, messages: list, response_model: Type[T], agent: str, stream: bool,
+                on_partial: Optional[Callable[[dict], None]], abort_if: Optional[Callable[[dict], Optional[str]]],
+                temperature: Optional[float], retries: int = 3) -> T:
+    """One model, served by the least-loaded backend; connection errors and timeouts fail over to the next one."""
+    pool = get_backend_pool()
+    tried = []
+    while True:
+        backend = pool.acquire(model, exclude=tried)
+        start = time.time()
+        try:
+            result = _call_backend(backend, model, list(messages), response_model, agent, stream, on_partial, abort_if,
+                                   temperature, retries)
+        except BaseException as e:
+            pool.release(backend, time.time() - start, e)
+            if not isinstance(e, BACKEND_ERRORS): raise
+            tried.append(backend.name)
+            if not pool.has_alternative(model, tried): raise
+            print(f"   🔀 {agent or model}: backend {backend.name} failed ({type(e).__name__}), failing over")
+            s = current_span()
+            if s: s.set(failovers=len(tried))
+            continue
+        pool.release(backend, time.time() - start)
+        return result
+
+def _call_backend(backend: Backend, model: str, messages: list, response_model: Type[T], agent: str, stream: bool,
+                  on_partial: Optional[Callable[[dict], None]], abort_if: Optional[Callable[[dict], Optional[str]]],
+                  temperature: Optional[float], retries: int) -> T:
+    # Backend errors propagate untouched: _call_model fails them over to another endpoint
+    if stream: on_partial = on_partial or log_progress(agent or model)
+    return _request_structured(backend.raw, model, messages, response_model, agent, stream, on_partial, abort_if,
+                               max_retries=retries, temperature=temperature)
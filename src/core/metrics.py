@@ -0,0 +1,49 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+class MissionStats:
+    """Wall-clock per mission phase plus attempts per step."""
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.attempts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            p = self.phases.setdefault(name, {"count": 0, "total_s": 0.0})
+            p["count"] += 1
+            p["total_s"] += seconds
+
+    def record_attempts(self, step_id: int, attempts: int):
+        with self._lock: self.attempts[step_id] = attempts
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "phases": {k: {"count": v["count"], "total_s": round(v["total_s"], 4)} for k, v in self.phases.items()},
+                "attempts": dict(self.attempts),
+            }
+
+_current: contextvars.ContextVar = contextvars.ContextVar("mission_stats", default=None)
+
+@contextmanager
+def collect(stats: Optional[MissionStats]):
+    token = _current.set(stats)
+    try: yield stats
+    finally: _current.reset(token)
+
+@contextmanager
+def phase(name: str):
+    """Time a block into the current mission's stats (no-op outside a mission)."""
+    stats = _current.get()
+    start = time.perf_counter()
+    try: yield
+    finally:
+        if stats is not None: stats.add(name, time.perf_counter() - start)
+
+def record_attempts(step_id: int, attempts: int):
+    stats = _current.get()
+    if stats is not None: stats.record_attempts(step_id, attempts)
@@ -4,6 +4,8 @@ class Step(BaseModel):
     id: int
     description: str
     tool_needed: Optional[str] = None
+    depends_on: Optional[List[int]] = None # None = depends on the previous step
+    expected_output: Optional[str] = None # Text the run's output must contain to pass
 class Plan(BaseModel):
     goal_analysis: str
     steps: List[Step]
@@ -18,3 +20,22 @@ class Critique(BaseModel):
 class AnalystResult(BaseModel):
     root_cause: str
     lesson_learned: str
+class ExecResult(BaseModel):
+    exit_code: Optional[int] = None
+    reason: str = "ok" # ok | error | timeout | cpu_limit | oom | signal | unavailable
+    signal: Optional[int] = None
+    duration_s: float = 0.0
+    output: str = ""
+    truncated_bytes: int = 0
+    def as_log(self) -> str:
+        """Text handed to the critic, keeping the historical 'Error (Exit Code N)' shape."""
+        if self.reason == "unavailable": return "Sandbox Not Running"
+        if self.reason == "ok": return self.output if self.output else "(No Output)"
+        detail = {
+            "timeout": f"Timeout: killed after {self.duration_s:.0f}s wall-clock limit",
+            "cpu_limit": "CPU time limit exceeded",
+            "oom": "Killed (SIGKILL): out of memory",
+            "signal": f"Killed by signal {self.signal}",
+        }.get(self.reason)
+        header = f"Error (Exit Code {self.exit_code}):" + (f" {detail}" if detail else "")
+        return f"{header}\n{self.output}"
@@ -1,15 +1,68 @@
 from src.agents import planner, coder, critic, analyst, researcher
-from src.memory.librarian import Librarian
-from src.core.config import load_config
+from src.memory.librarian import Librarian, skill_code
+from src.core.config import get_config, load_config
+from src.core.llm import cache_stats, llm_stats, repair_stats, StreamAborted
+from src.core.backends import get_backend_pool
+from src.core.scheduler import ancestors, resolve_dependencies, run_as_ready
+from src.core.context import ContextBuilder, ContextItem, budget_for, format_report
+from src.core.models import CodeOutput
+from src.core.metrics import MissionStats, collect, phase, record_attempts
+from src.core.tracing import span
+from src.core.checkpoint import Checkpoint
+from src.core.router import get_router
 from src.tools.registry import ToolRegistry
-from src.tools.custom_tools import web_search, run_shell, list_files, get_sandbox
-from src.tools.mcp_adapter import MCPConnector
+from src.tools.custom_tools import web_search, run_shell, list_files, get_sandbox_pool, use_sandbox
+from src.tools.mcp_adapter import get_mcp_connector
+from src.core.sandbox import copy_changed, snapshot_dir
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
 import os
+import queue
 import re
+import shutil
+import threading
 
-def run_mission(objective: str):
-    lib = Librarian()
-    sandbox = get_sandbox()
+class MissionCancelled(Exception):
+    pass
+
+def _check_cancelled(cancel: threading.Event = None):
+    # Cooperative: checked before each step and attempt, in-flight calls finish first
+    if cancel is not None and cancel.is_set(): raise MissionCancelled("Mission cancelled")
+
+def run_mission(objective: str = None, stats: MissionStats = None, lib: Librarian = None, cancel: threading.Event = None,
+                mission_id: str = None, resume: bool = False):
+    """Run a mission, or with resume=True continue checkpointed mission `mission_id` from its first unfinished step."""
+    if resume:
+        checkpoint = Checkpoint.load(mission_id)
+        if checkpoint is None: raise ValueError(f"No checkpoint for mission {mission_id}")
+        if checkpoint.state.status == "done":
+            print(f"✅ Mission {mission_id} already finished; nothing to resume")
+            return "Mission Complete"
+        objective = checkpoint.state.objective
+    else:
+        checkpoint = Checkpoint.create(objective, mission_id)
+    # Lease a warm sandbox slot for the whole mission; tools see it via use_sandbox
+    with collect(stats), span("mission", objective=objective, mission_id=checkpoint.state.id, resumed=resume) as root:
+        print(f"🧵 Trace: {root.trace_id}")
+        if checkpoint.enabled: print(f"💾 Checkpoint: {checkpoint.state.id} (resume with: python main.py --resume {checkpoint.state.id})")
+        with phase("startup"):
+            lib = lib or Librarian()
+            pool = get_sandbox_pool()
+        with pool.lease() as sandbox, use_sandbox(sandbox):
+            try:
+                result = _run_mission(objective, sandbox, lib, cancel, checkpoint)
+                root.set(result=result)
+                checkpoint.finish("failed" if result.startswith("Failed") else "done")
+                # Did the recalled skills help? Feeds memory maintenance
+                if checkpoint.claim_outcome(): lib.record_outcome(checkpoint.state.recalled, not result.startswith("Failed"))
+                return result
+            except MissionCancelled:
+                checkpoint.finish("cancelled")
+                raise
+            finally:
+                with phase("memorize"): lib.flush()
+
+def _run_mission(objective: str, sandbox, lib: Librarian, cancel: threading.Event, checkpoint: Checkpoint):
     config = load_config()
     
     # Tool Adapter for Researcher Agent
@@ -23,103 +76,334 @@ def run_mission(objective: str):
         return output
 
     registry = ToolRegistry()
-    registry.register(web_search, "Search internet. Input: query")
-    registry.register(run_shell, "Run shell command. Input: command")
-    registry.register(list_files, "List files. Input: (ignored)")
-    registry.register(research_adapter, "Deep technical research. Input: query") # research_topic maps to this
+    # Planners often repeat lookups across steps; anything touching files invalidates list_files
+    registry.register(web_search, "Search internet. Input: query", cache="ttl", ttl=600, timeout=30,
+                      cacheable=lambda result: result != "Search failed.")
+    registry.register(run_shell, "Run shell command. Input: command", invalidates=["list_files"])
+    registry.register(list_files, "List files. Input: (ignored)", cache="mission", ignore_args=["dummy"])
+    registry.register(research_adapter, "Deep technical research. Input: query", cache="mission", max_concurrency=2) # research_topic maps to this
     
-    try:
-        mcp = MCPConnector(registry)
-        ws_path = os.path.abspath("workspace")
-        # mcp.connect("npx", ["-y", "@modelcontextprotocol/server-filesystem", ws_path])
-    except: pass
+    # e.g. "mcp": {"servers": {"filesystem": {"command": "npx", "args": ["-y", "@modelcontextprotocol/server-filesystem", "{workspace}"]}}}
+    servers = get_config().mcp.servers
+    if servers:
+        # Servers are shared across missions; only the tool wrappers are per registry
+        mcp = get_mcp_connector()
+        for name, server in servers.items():
+            try: mcp.connect(registry, server.command, [a.replace("{workspace}", sandbox.host_dir) for a in server.args], server.env, name=name)
+            except Exception as e: print(f"⚠️ MCP [{name}] unavailable: {e}")
     
     print(f"🚀 Mission: {objective}")
     
-    knowledge = lib.recall(objective)
-    current_context = knowledge
-    plan = None
-    
-    # --- Phase 1: Initial Planning ---
-    # We do one pass of planning. If the first step is a tool, we might loop here,
-    # but now we can also handle tools inside the main loop.
-    print(f"🧠 Planning...")
-    plan = planner.create_plan_with_tools(objective, current_context, registry)
-            
+    state = checkpoint.state
+    if state.plan:
+        # Resuming: skip planning, rebuild context and workspace from finished steps
+        plan = state.plan
+        done = sum(checkpoint.is_done(s.id) for s in plan.steps)
+        print(f"⏯️ Resuming at {done}/{len(plan.steps)} finished steps")
+        checkpoint.restore_workspace(sandbox.host_dir)
+        context = ContextBuilder(state.context)
+        context.extend(checkpoint.completed_items())
+    else:
+        context = ContextBuilder()
+        skill = lib.recall_skill(objective)
+        recalled = [skill["id"]] if skill else []
+        context.add("knowledge", skill["document"] if skill else "")
+        plan = None
+
+        # --- Phase 1: Initial Planning ---
+        # We do one pass of planning. If the first step is a tool, we might loop here,
+        # but now we can also handle tools inside the main loop.
+        print(f"🧠 Planning...")
+        planner_context, _ = context.build(objective, budget_for(config['models']['planner']))
+        with phase("planning"):
+            plan = planner.create_plan_with_tools(objective, planner_context, registry)
+        checkpoint.record_plan(plan, context.items, recalled)
+
     print(f"📋 Steps: {len(plan.steps)}")
-    accumulated_deps = []
-    
-    # --- Phase 2: Hybrid Execution Loop (Tools + Coding) ---
-    for step in plan.steps:
+    accumulated_deps = list(state.dependencies)
+    deps_lock = threading.Lock()
+    if accumulated_deps:
+        print(f"   📦 Restoring: {accumulated_deps}")
+        with phase("dependency_install"): sandbox.install(accumulated_deps)
+    generated = {} # step id -> filename of the passing code
+    dependencies = resolve_dependencies(plan.steps)
+    upstream = ancestors(dependencies)
+    owners = {} # filename -> step id that last wrote it in the mission workspace
+    owners_lock = threading.Lock()
+
+    def claim(step_id: int, filename: str) -> str:
+        """Filename step_id may write. Files from steps it depends on (or restored on resume) are its to update;
+        a name owned by a step outside its dependencies, which may run alongside it, gets a per-step variant."""
+        with owners_lock:
+            owner = owners.get(filename, step_id)
+            if owner != step_id and owner not in upstream.get(step_id, set()):
+                stem, ext = os.path.splitext(filename)
+                filename = f"{stem}_{step_id}{ext or '.py'}"
+            owners[filename] = step_id
+            return filename
+
+    def install_deps(deps: list):
+        with deps_lock:
+            new_deps = [d for d in deps if d not in accumulated_deps]
+            if not new_deps: return
+            print(f"   📦 Installing: {new_deps}")
+            with phase("dependency_install"): sandbox.install(new_deps)
+            accumulated_deps.extend(new_deps)
+            checkpoint.record_dependencies(accumulated_deps)
+
+    pool = get_sandbox_pool()
+    speculative = get_config().speculative
+    if speculative.enabled and pool.size < speculative.candidates + 1:
+        # The mission holds one slot; candidates only get the others
+        print(f"⚠️ speculative.candidates={speculative.candidates} needs sandbox.pool_size >= {speculative.candidates + 1}, have {pool.size}: "
+              + ("speculation will not run" if pool.size < 3 else f"at most {pool.size - 1} candidates will race"))
+
+    def speculate(step, prompt_context: str, attempts: int):
+        """Race K candidates in spare pool slots; the first to pass is merged into the mission sandbox.
+        Returns (winning CodeOutput or None, [(label, log, fix)]), or None when fewer than two slots are free."""
+        settings = get_config().speculative
+        slots = []
+        for _ in range(settings.candidates):
+            try: slots.append(pool.acquire(timeout=0))
+            except queue.Empty: break
+        if len(slots) < 2:
+            for sb in slots: pool.release(sb)
+            if pool.size >= 3: print("   🎲 Fewer than two idle sandboxes, generating a single candidate")
+            return None
+        print(f"   🎲 Speculating {len(slots)} candidates")
+        won = threading.Event()
+        merge_lock = threading.Lock()
+
+        def abort_if(partial: dict):
+            if won.is_set(): return "Another candidate already passed"
+            return coder.check_partial(partial)
+
+        def run_candidate(i: int, sb):
+            # Each slot starts from the mission workspace and dependency set
+            shutil.copytree(sandbox.host_dir, sb.host_dir, dirs_exist_ok=True)
+            baseline = snapshot_dir(sb.host_dir)
+            if accumulated_deps: sb.install(list(accumulated_deps))
+            instruction = step.description if i == 0 else f"{step.description}\n(Variant {i + 1}: try a different approach than the most obvious one.)"
+            with phase("codegen"):
+                code_obj = coder.write_code(instruction, prompt_context, use_cache=attempts == 0 and i == 0, abort_if=abort_if,
+                                            workspace=sb.host_dir, temperature=None if i == 0 else settings.temperature, tier=attempts,
+                                            claim=lambda name: claim(step.id, name))
+            if won.is_set(): return None
+            if code_obj.dependencies: sb.install(list(code_obj.dependencies))
+            with phase("sandbox_run"): result = sb.execute(code_obj.filename)
+            if won.is_set(): return None
+            with phase("critique"): review = critic.review_code(code_obj.filename, result.as_log(), step)
+            get_router().record_outcome("coder", review.is_passing)
+            if review.is_passing:
+                with merge_lock:
+                    if won.is_set(): return None
+                    won.set()
+                    for other in slots:
+                        if other is not sb: other.kill_running()
+                    # Merge before this future completes, which hands the slot back for reset
+                    copy_changed(sb.host_dir, sandbox.host_dir, baseline)
+            return code_obj, result.as_log(), review
+
+        executor = ThreadPoolExecutor(max_workers=len(slots), thread_name_prefix="candidate")
+        futures = {}
+        for i, sb in enumerate(slots):
+            future = executor.submit(contextvars.copy_context().run, run_candidate, i, sb)
+            future.add_done_callback(lambda _, sb=sb: pool.release(sb))
+            futures[future] = i
+        # Losers finish in the background and return their slots when done
+        executor.shutdown(wait=False)
+
+        failures = []
+        for future in as_completed(futures):
+            label = f"Candidate {futures[future] + 1}"
+            try: outcome = future.result()
+            except StreamAborted as e:
+                failures.append((label, f"Aborted during generation: {e}", None))
+                continue
+            except Exception as e:
+                failures.append((label, f"Candidate crashed: {e}", None))
+                continue
+            if outcome is None: continue
+            code_obj, exec_log, review = outcome
+            if review.is_passing:
+                print(f"   🏁 {label} won")
+                install_deps(code_obj.dependencies)
+                return code_obj, failures
+            failures.append((label, exec_log, review.suggested_fix))
+        return None, failures
+
+    def auto_fix_dependencies(exec_log: str):
+        match = re.search(r"No module named '(\w+)'", exec_log)
+        if match:
+            lib_name = match.group(1)
+            PKG_MAP = {
+                "PIL": "Pillow", "cv2": "opencv-python-headless",
+                "sklearn": "scikit-learn", "bs4": "beautifulsoup4",
+                "qrcode": "qrcode[pil]"
+            }
+            if lib_name in PKG_MAP:
+                lib_name = PKG_MAP[lib_name]
+
+            print(f"   📦 Auto-Install Missing: {lib_name}")
+            install_deps([lib_name])
+
+    def step_passed(step, code_obj, attempts: int):
+        print(f"   ✅ Step {step.id} Passed")
+        record_attempts(step.id, attempts + 1)
+        generated[step.id] = code_obj.filename
+        registry.invalidate("list_files")
+        sandbox.publish()
+        with phase("memorize"): lib.memorize(step.description, code_obj.code, code_obj.filename, dependencies=code_obj.dependencies)
+        # Add success signal to context
+        return True, [ContextItem(kind="step_done", text=f"[Step {step.id} Completed]: Created {code_obj.filename}", step_id=step.id)]
+
+    def reuse_skill(step):
+        """Fast path: a stored skill whose objective matches this step is run as is, without the coder.
+        Returns (passing CodeOutput or None, attempt log for the coder or None)."""
+        settings = get_config().memory
+        if not settings.reuse_enabled: return None, None
+        skill = lib.recall_skill(step.description, min_match=settings.reuse_similarity)
+        code = skill_code(skill["document"]) if skill else None
+        if not code: return None, None
+        meta = skill["metadata"]
+        filename = claim(step.id, os.path.basename(meta.get("filename") or "") or f"skill_{step.id}.py")
+        code_obj = CodeOutput(filename=filename, code=code, dependencies=[d for d in meta.get("dependencies", "").split(",") if d])
+        print(f"   ♻️ Reusing stored skill (match {skill['match']:.2f}): {filename}")
+        path = os.path.join(sandbox.host_dir, filename)
+        with open(path, "w", encoding="utf-8") as f: f.write(code)
+        install_deps(code_obj.dependencies)
+        with phase("sandbox_run"): result = sandbox.execute(filename)
+        registry.invalidate("list_files")
+        exec_log = result.as_log()
+        with phase("critique"): review = critic.review_code(filename, exec_log, step)
+        lib.record_outcome([skill["id"]], review.is_passing)
+        if review.is_passing: return code_obj, None
+        print(f"   ↩️ Stored skill failed review, generating new code")
+        os.remove(path)
+        auto_fix_dependencies(exec_log)
+        return None, f"Reused stored skill {filename} Log:\n{exec_log}\nFix Suggestion: {review.suggested_fix}"
+
+    # Returns (success, context items to merge into the shared context)
+    def execute_step(step, context: ContextBuilder):
+        with span("step", step_id=step.id, tool=step.tool_needed) as s:
+            ok, items = _execute_step(step, context)
+            s.set(ok=ok)
+            checkpoint.record_step(step.id, ok, items, generated.get(step.id), sandbox.host_dir if ok else None)
+            return ok, items
+
+    def _execute_step(step, context: ContextBuilder):
         print(f"▶️ Step {step.id}: {step.description}")
-        
+
         # [FIX] Check if this step requires a Tool instead of Coding
         if step.tool_needed and step.tool_needed.lower() != "none":
             t_name = step.tool_needed
             t_args = step.description
-            
+
             print(f"🔎 Using Tool [{t_name}]: {t_args}")
-            
+
             # Execute Tool
-            res = registry.execute(t_name, argument=t_args)
-            
+            with phase("tool"): res = registry.execute(t_name, argument=t_args)
+
             # Show summary
             summary = res[:200] + "..." if len(res) > 200 else res
             print(f"   Result: {summary}")
-            
-            # Update Context for next steps
-            current_context += f"\n[Result from Step {step.id} ({t_name})]:\n{res}\n"
-            
+
             # Skip coding for this step
-            continue
+            return True, [ContextItem(kind="tool_result", text=f"[Result from Step {step.id} ({t_name})]:\n{res}", step_id=step.id)]
 
         # If no tool needed, proceed to Coding
         attempts = 0
-        success = False
-        step_context = current_context # Pass accumulated context
-        
-        while attempts < 3 and not success:
-            code_obj = coder.write_code(step.description, step_context)
-            
+        step_context = context.copy() # Attempt logs stay local to this step
+        budget = budget_for(config['models']['coder'])
+
+        max_attempts = config.get("max_attempts_per_step", 3)
+
+        # A repeat of a memorized skill skips code generation entirely; the coder only sees it if it fails
+        reused, reuse_log = reuse_skill(step)
+        if reused: return step_passed(step, reused, attempts)
+        if reuse_log: step_context.add("attempt_log", reuse_log, step.id)
+
+        while attempts < max_attempts:
+            _check_cancelled(cancel)
+            prompt_context, report = step_context.build(step.description, budget)
+            print(f"   🧮 Context: {format_report(report)}")
+
+            outcome = speculate(step, prompt_context, attempts) if get_config().speculative.enabled else None
+            if outcome is not None:
+                winner, failures = outcome
+                if winner: return step_passed(step, winner, attempts)
+                attempts += 1
+                print(f"   ❌ Step {step.id} Failed: {len(failures)} candidates ({attempts}/{max_attempts})")
+                for label, exec_log, fix in failures:
+                    auto_fix_dependencies(exec_log)
+                    step_context.add("attempt_log", f"Attempt {attempts} {label} Log:\n{exec_log}\nFix Suggestion: {fix}", step.id)
+                continue
+            try:
+                # Retries must see a fresh generation, never a replayed one
+                with phase("codegen"):
+                    # Each rejected attempt climbs one tier of the coder's model ladder
+                    code_obj = coder.write_code(step.description, prompt_context, use_cache=attempts == 0, abort_if=coder.check_partial,
+                                                workspace=sandbox.host_dir, tier=attempts, claim=lambda name: claim(step.id, name))
+            except StreamAborted as e:
+                attempts += 1
+                print(f"   ❌ Step {step.id} Generation Aborted ({attempts}/{max_attempts})")
+                step_context.add("attempt_log", f"Attempt {attempts} was aborted during generation: {e}", step.id)
+                continue
+
             # Install Deps
-            new_deps = [d for d in code_obj.dependencies if d not in accumulated_deps]
-            if new_deps:
-                print(f"   📦 Installing: {new_deps}")
-                sandbox.run_code("dummy.py", dependencies=new_deps)
-                accumulated_deps.extend(new_deps)
-                
+            install_deps(code_obj.dependencies)
+
             print(f"   📄 File: {code_obj.filename}")
-            exec_log = sandbox.run_code(code_obj.filename)
-            review = critic.review_code(code_obj.filename, exec_log)
-            
-            if review.is_passing:
-                print("   ✅ Passed")
-                success = True
-                lib.memorize(step.description, code_obj.code, code_obj.filename)
-                # Add success signal to context
-                current_context += f"\n[Step {step.id} Completed]: Created {code_obj.filename}\n"
-            else:
-                # Auto-Fix Dependencies
-                match = re.search(r"No module named '(\w+)'", exec_log)
-                if match:
-                    lib_name = match.group(1)
-                    PKG_MAP = {
-                        "PIL": "Pillow", "cv2": "opencv-python-headless",
-                        "sklearn": "scikit-learn", "bs4": "beautifulsoup4",
-                        "qrcode": "qrcode[pil]" 
-                    }
-                    if lib_name in PKG_MAP: 
-                        lib_name = PKG_MAP[lib_name]
-                        
-                    print(f"   📦 Auto-Install Missing: {lib_name}")
-                    sandbox.run_code("dummy.py", dependencies=[lib_name])
-                    accumulated_deps.append(lib_name)
-                
-                attempts += 1
-                print(f"   ❌ Failed ({attempts}/3)")
-                step_context += f"\nAttempt {attempts} Log:\n{exec_log}\nFix Suggestion: {review.suggested_fix}\n"
-        
-        if not success:
-            return f"Failed: {step.description}"
-            
+            with phase("sandbox_run"): result = sandbox.execute(code_obj.filename)
+            registry.invalidate("list_files")
+            if result.reason in ("timeout", "cpu_limit", "oom", "signal"):
+                print(f"   ⏱️ Run ended by {result.reason} after {result.duration_s:.1f}s")
+            exec_log = result.as_log()
+            with phase("critique"): review = critic.review_code(code_obj.filename, exec_log, step)
+            get_router().record_outcome("coder", review.is_passing)
+
+            if review.is_passing: return step_passed(step, code_obj, attempts)
+
+            # Auto-Fix Dependencies
+            auto_fix_dependencies(exec_log)
+
+            attempts += 1
+            print(f"   ❌ Step {step.id} Failed ({attempts}/{max_attempts})")
+            step_context.add("attempt_log", f"Attempt {attempts} Log:\n{exec_log}\nFix Suggestion: {review.suggested_fix}", step.id)
+        record_attempts(step.id, attempts)
+        return False, []
+
+    def print_summary():
+        print(f"📊 LLM Cache: {cache_stats()} | Latency: {llm_stats()} | Tools: {registry.stats}")
+        if get_config().routing.enabled: print(f"🪜 Routing: {get_router().stats()}")
+        repairs = repair_stats()
+        if repairs: print(f"🩹 Output repairs: {repairs}")
+        backends = get_backend_pool().stats()
+        if len(backends) > 1: print(f"🔀 LLM Backends: {backends}")
+
+    # --- Phase 2: Hybrid Execution Loop (Tools + Coding) ---
+    # A step starts as soon as its dependencies finish; it sees the shared context plus
+    # the results of every step finished by then, merged in plan order.
+    max_parallel = config.get("max_parallel_steps", 3)
+    pending = [s for s in plan.steps if not checkpoint.is_done(s.id)]
+    finished = {} # step id -> context items of passed steps
+    finished_lock = threading.Lock()
+
+    def run_step(step):
+        _check_cancelled(cancel)
+        step_context = context.copy()
+        with finished_lock: items = [finished[s.id] for s in plan.steps if s.id in finished]
+        for done_items in items: step_context.extend(done_items)
+        ok, items = execute_step(step, step_context)
+        if ok:
+            with finished_lock: finished[step.id] = items
+        return ok, items
+
+    results = run_as_ready(pending, dependencies, run_step, max_parallel, ok=lambda r: r[0])
+    failed = next((s for s in pending if s.id in results and not results[s.id][0]), None)
+    if failed:
+        print_summary()
+        return f"Failed: {failed.description}"
+
+    print_summary()
     return "Mission Complete"
@@ -0,0 +1,162 @@
+"""Local fixes for near-miss structured output, tried before paying for another generation."""
+import ast
+import json
+import re
+import types
+import typing
+from typing import Any, List, Optional, Tuple, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+FENCE = re.compile(r"```[\w+-]*[ \t]*\n(.*?)(?:\n[ \t]*```|\Z)", re.DOTALL)
+VALID_ESCAPES = set('"\\/bfnrtu')
+TRUTHY = {"pass", "passed", "passing", "ok", "success", "succeeded"}
+FALSY = {"fail", "failed", "failing", "error", "none", "null"}
+
+def _outer_object(text: str) -> Optional[str]:
+    """First balanced {...}; braces inside strings don't count. None when it never closes (truncated output)."""
+    start = text.find("{")
+    if start < 0: return None
+    depth, in_str, escape = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escape: escape = False
+            elif ch == "\\": escape = True
+            elif ch == '"': in_str = False
+        elif ch == '"': in_str = True
+        elif ch == "{": depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0: return text[start:i + 1]
+    return None
+
+def _normalize(text: str, fixes: List[str]) -> str:
+    """Escape raw control characters and stray backslashes inside strings; drop trailing commas outside them."""
+    out, in_str, i = [], False, 0
+    while i < len(text):
+        ch = text[i]
+        if in_str:
+            if ch == "\\":
+                nxt = text[i + 1] if i + 1 < len(text) else ""
+                if nxt and nxt in VALID_ESCAPES:
+                    out.append(ch + nxt)
+                    i += 2
+                    continue
+                # Regexes and Windows paths in code: "\d" is not a JSON escape
+                out.append("\\\\")
+                fixes.append("escapes")
+            elif ch == '"':
+                in_str = False
+                out.append(ch)
+            elif ch < " ":
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}.get(ch, f"\\u{ord(ch):04x}"))
+                fixes.append("newlines")
+            else: out.append(ch)
+        elif ch == '"':
+            in_str = True
+            out.append(ch)
+        elif ch == "," and re.match(r"\s*[}\]]", text[i + 1:]):
+            fixes.append("trailing_comma")
+        else: out.append(ch)
+        i += 1
+    return "".join(out)
+
+def _longest_fence(text: str) -> Optional[str]:
+    blocks = [b.strip() for b in FENCE.findall(text) if b.strip() and not b.lstrip().startswith("{")]
+    return max(blocks, key=len) if blocks else None
+
+def _load(text: str, fixes: List[str]) -> Any:
+    body = _outer_object(text)
+    if body is None: return None
+    outside = text.replace(body, "", 1).strip()
+    if outside: fixes.append("fences" if "```" in outside else "prose")
+    try: return json.loads(body)
+    except json.JSONDecodeError: pass
+    normalized_fixes: List[str] = []
+    try:
+        data = json.loads(_normalize(body, normalized_fixes))
+        fixes.extend(dict.fromkeys(normalized_fixes))
+        return data
+    except json.JSONDecodeError: pass
+    # Python dict syntax: single quotes, True/False/None
+    try:
+        data = ast.literal_eval(body)
+        fixes.append("python_literal")
+        return data
+    except (ValueError, SyntaxError, MemoryError, RecursionError): return None
+
+def _unwrap_optional(annotation):
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1: return args[0], True
+    return annotation, False
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+def _coerce(value: Any, annotation) -> Any:
+    annotation, optional = _unwrap_optional(annotation)
+    if value is None: return None if optional else value
+    origin = typing.get_origin(annotation)
+    if annotation is bool and isinstance(value, str):
+        word = value.strip().lower()
+        if word in TRUTHY: return True
+        if word in FALSY: return False
+    elif annotation is str:
+        if isinstance(value, list): return "\n".join(v if isinstance(v, str) else json.dumps(v) for v in value)
+        if isinstance(value, dict): return json.dumps(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool): return str(value)
+    elif annotation is int and isinstance(value, str) and re.fullmatch(r"\s*#?\s*\d+\s*", value):
+        return int(value.strip().lstrip("#"))
+    elif origin in (list, List):
+        item = (typing.get_args(annotation) or (Any,))[0]
+        if isinstance(value, str): value = [v.strip() for v in re.split(r"[,\n]", value) if v.strip()]
+        elif not isinstance(value, list): value = [value]
+        return [_coerce(v, item) for v in value]
+    elif _is_model(annotation) and isinstance(value, dict):
+        return _fit(value, annotation, [])
+    return value
+
+def _fit(data: dict, response_model: Type[BaseModel], fixes: List[str]) -> dict:
+    fields = response_model.model_fields
+    # {"CodeOutput": {...}} or {"response": {...}}
+    if len(data) == 1:
+        (key, inner), = data.items()
+        if key not in fields and isinstance(inner, dict) and set(inner) & set(fields):
+            data = inner
+            fixes.append("unwrapped")
+    out = {}
+    for key, value in data.items():
+        name = key if key in fields else re.sub(r"[\s-]+", "_", str(key).strip()).lower()
+        if name != key and name in fields: fixes.append("keys")
+        if name not in fields:
+            out[key] = value
+            continue
+        coerced = _coerce(value, fields[name].annotation)
+        if coerced != value: fixes.append("coerced")
+        out[name] = coerced
+    return out
+
+def repair(text: str, response_model: Type[T]) -> Tuple[Optional[T], List[str]]:
+    """(instance, fixes applied) for output that failed validation; (None, fixes) when it can't be saved locally."""
+    fixes: List[str] = []
+    fields = response_model.model_fields
+    data = _load(text, fixes)
+    if not isinstance(data, dict): data = None
+    code = _longest_fence(text) if "code" in fields else None
+    if data is None:
+        if not code: return None, fixes
+        # No usable JSON but a fenced program: keep the program, leave the rest to defaults
+        data = {"code": code}
+        for name, field in fields.items():
+            if name != "code" and field.is_required() and _unwrap_optional(field.annotation)[0] is str: data[name] = ""
+        fixes.append("code_block")
+    data = _fit(data, response_model, fixes)
+    if code and not data.get("code"):
+        data["code"] = code
+        fixes.append("code_block")
+    fixes = list(dict.fromkeys(fixes))
+    try: return response_model.model_validate(data), fixes
+    except ValidationError: return None, fixes
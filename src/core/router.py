@@ -0,0 +1,98 @@
+"""Per-agent model ladders: start on the fastest tier, escalate on failure, and skip tiers that keep failing."""
+import contextvars
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from src.core.config import get_config
+
+_last_routed: contextvars.ContextVar = contextvars.ContextVar("last_routed", default=None)
+
+class TierStats:
+    def __init__(self, window: int):
+        self.valid = deque(maxlen=window)    # Schema-valid response or not
+        self.accepted = deque(maxlen=window) # Downstream verdict, e.g. the critic passing the code
+        self.calls = 0
+        self.total_latency = 0.0
+        self.skipped = 0
+
+    def success_rate(self, min_samples: int) -> Optional[float]:
+        # Prefer real outcomes; fall back to "at least it parsed"
+        for samples in (self.accepted, self.valid):
+            if len(samples) >= min_samples: return sum(samples) / len(samples)
+        return None
+
+class ModelRouter:
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], TierStats] = {}
+        self._lock = threading.Lock()
+
+    def _tier(self, agent: str, model: str) -> TierStats:
+        key = (agent or "unknown", model)
+        if key not in self._stats: self._stats[key] = TierStats(get_config().routing.window)
+        return self._stats[key]
+
+    def ladder(self, agent: str, model: str) -> List[str]:
+        settings = get_config().routing
+        if not settings.enabled: return [model]
+        return settings.ladders.get(agent) or [model]
+
+    def is_complex(self, hint: str) -> bool:
+        settings = get_config().routing
+        if len(hint) > settings.complex_chars: return True
+        text = hint.lower()
+        return any(re.search(rf"\b{re.escape(k)}", text) for k in settings.complex_keywords)
+
+    def route(self, agent: str, model: str, tier: int = 0, hint: str = "") -> List[str]:
+        """Models to try in order: from the starting tier up to the top of the ladder."""
+        ladder = self.ladder(agent, model)
+        if len(ladder) == 1: return ladder
+        settings = get_config().routing
+        start = tier + (1 if hint and self.is_complex(hint) else 0)
+        with self._lock:
+            while start < len(ladder) - 1:
+                t = self._tier(agent, ladder[start])
+                rate = t.success_rate(settings.min_samples)
+                if rate is None or rate >= settings.min_success_rate: break
+                # Probe a skipped tier now and then so it can earn its place back
+                t.skipped += 1
+                if t.skipped % settings.probe_every == 0: break
+                start += 1
+        return ladder[min(start, len(ladder) - 1):]
+
+    def record(self, agent: str, model: str, ok: bool, latency: float):
+        with self._lock:
+            t = self._tier(agent, model)
+            t.calls += 1
+            t.total_latency += latency
+            t.valid.append(ok)
+        # Copy-on-write so context copies (parallel steps) never share the mapping
+        if ok: _last_routed.set({**(_last_routed.get() or {}), agent: model})
+
+    def forget_last(self, agent: str):
+        """The next answer for `agent` came from no model (e.g. the cache): verdicts on it credit nobody."""
+        last = _last_routed.get() or {}
+        if agent in last: _last_routed.set({k: v for k, v in last.items() if k != agent})
+
+    def record_outcome(self, agent: str, accepted: bool):
+        """Attach a downstream verdict to the model that last answered for `agent` in this context."""
+        model = (_last_routed.get() or {}).get(agent)
+        if not model: return
+        with self._lock: self._tier(agent, model).accepted.append(accepted)
+
+    def stats(self) -> dict:
+        out = {}
+        with self._lock:
+            for (agent, model), t in self._stats.items():
+                rate = t.success_rate(1)
+                out.setdefault(agent, {})[model] = {
+                    "calls": t.calls,
+                    "success_rate": round(rate, 2) if rate is not None else None,
+                    "avg_latency_s": round(t.total_latency / t.calls, 2) if t.calls else None,
+                }
+        return out
+
+_router = ModelRouter()
+
+def get_router() -> ModelRouter:
+    return _router
@@ -1,53 +1,431 @@
 import docker
+import hashlib
 import os
+import queue
+import shlex
+import shutil
+import signal
+import threading
 import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+from src.core.config import get_config, resolve_path
+from src.core.models import ExecResult
+from src.core.tracing import span
+
+POOL_LABEL = "emacs.sandbox.owner"
+DEPS_REPOSITORY = "emacs-deps"
+
+def deps_image_tag(base_image: str, dependencies: List[str]) -> str:
+    """Image tag for a base image plus a normalised, order-independent dependency set."""
+    normalized = sorted({d.strip().lower().replace("_", "-") for d in dependencies if d.strip()})
+    return hashlib.sha256("\n".join([base_image, *normalized]).encode()).hexdigest()[:16]
+
+def prune_deps_images(client, keep: int) -> int:
+    """Remove all but the `keep` newest cached dependency images; images a container still uses are skipped."""
+    removed = 0
+    try: images = sorted(client.images.list(name=DEPS_REPOSITORY), key=lambda i: i.attrs.get("Created", ""), reverse=True)
+    except Exception: return 0
+    for image in images[keep:]:
+        try:
+            client.images.remove(image.id)
+            removed += 1
+        except Exception: pass
+    return removed
+
+class OutputCapture:
+    """Keeps the first and last bytes of a stream and counts what was dropped in between."""
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes, self.tail_bytes = head_bytes, tail_bytes
+        self.head, self.tail = bytearray(), bytearray()
+        self.dropped = 0
+
+    def write(self, data: bytes):
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data: return
+        self.tail += data
+        excess = len(self.tail) - self.tail_bytes
+        if excess > 0:
+            del self.tail[:excess]
+            self.dropped += excess
+
+    def text(self) -> str:
+        head, tail = self.head.decode("utf-8", "replace"), self.tail.decode("utf-8", "replace")
+        if not self.dropped: return head + tail
+        return f"{head}\n... [{self.dropped} bytes omitted] ...\n{tail}"
+
+class _LineEcho:
+    """Prints output lines to the mission log as they arrive, up to a limit."""
+    def __init__(self, max_lines: int, prefix: str = "   │ "):
+        self.max_lines = max_lines
+        self.prefix = prefix
+        self.lines = 0
+        self.buffers = {}
+
+    def write(self, stream: str, data: bytes):
+        buffer = self.buffers.get(stream, b"") + data
+        *lines, buffer = buffer.split(b"\n")
+        # Progress bars without newlines would otherwise grow the buffer forever
+        if len(buffer) > 4096: lines, buffer = lines + [buffer], b""
+        self.buffers[stream] = buffer
+        for line in lines: self._emit(line)
+
+    def _emit(self, line: bytes):
+        self.lines += 1
+        if self.lines <= self.max_lines: print(self.prefix + line.decode("utf-8", "replace").rstrip("\r"))
+        elif self.lines == self.max_lines + 1: print(self.prefix + "... (further output not echoed)")
+
+    def flush(self):
+        for stream, buffer in self.buffers.items():
+            if buffer: self._emit(buffer)
+        self.buffers.clear()
+
+def snapshot_dir(path: str) -> dict:
+    """relative path -> (size, mtime) for every file under path."""
+    snap = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(root, name)
+            try: st = os.stat(full)
+            except OSError: continue
+            snap[os.path.relpath(full, path)] = (st.st_size, st.st_mtime)
+    return snap
+
+def copy_changed(src: str, dst: str, baseline: dict) -> List[str]:
+    """Copy files that are new or changed relative to baseline; returns their relative paths."""
+    copied = []
+    for rel, stat in snapshot_dir(src).items():
+        if baseline.get(rel) == stat: continue
+        target = os.path.join(dst, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            shutil.copy2(os.path.join(src, rel), target)
+            copied.append(rel)
+        except OSError as e: print(f"⚠️ Copy failed for {rel}: {e}")
+    return copied
+
+def classify_exit(exit_code: Optional[int], timed_out: bool, duration_s: float = 0.0, timeout: Optional[float] = None,
+                  cpu_s: Optional[float] = None, cpu_limit_s: Optional[float] = None, oom_killed: bool = False) -> tuple:
+    """Map a shell exit status to (reason, signal number)."""
+    if exit_code == 0: return "ok", None
+    if timed_out or exit_code == 124: return "timeout", None
+    if exit_code is not None and exit_code > 128:
+        sig = exit_code - 128
+        if sig == signal.SIGXCPU: return "cpu_limit", sig
+        if sig == signal.SIGKILL:
+            # SIGKILL has three senders: timeout -k after an ignored TERM, the hard CPU ulimit and the OOM killer
+            if timeout and duration_s >= timeout: return "timeout", None
+            if cpu_s is not None and cpu_limit_s and cpu_s >= cpu_limit_s: return "cpu_limit", sig
+            if oom_killed: return "oom", sig
+        return "signal", sig
+    return "error", None
+
+# Kernel OOM kills in the container's memory cgroup (v2, then v1); empty if neither is readable
+OOM_COUNT = "grep -h '^oom_kill ' /sys/fs/cgroup/memory.events /sys/fs/cgroup/memory/memory.oom_control 2>/dev/null | head -1 | cut -d' ' -f2"
+
+def _cpu_seconds(times_line: str) -> Optional[float]:
+    """Sum of the user and system times in a `times` line such as '0m2.980000s 0m0.010000s'."""
+    total = 0.0
+    for field in times_line.split():
+        minutes, _, seconds = field.rstrip("s").partition("m")
+        try: total += float(minutes) * 60 + float(seconds)
+        except ValueError: return None
+    return total
+
+def docker_client():
+    """Docker client whose socket timeout outlasts the exec watchdog: a script that prints nothing
+    for a while must not break the streamed read (docker-py's default is 60s)."""
+    return docker.from_env(timeout=int(get_config().sandbox.exec_timeout_s) + 60)
 
 class DockerSandbox:
-    def __init__(self):
+    def __init__(self, name: str = "emacs-sandbox", workspace: str = "workspace", image: str = None, client=None, labels: dict = None):
+        self.name = name
+        self.host_dir = os.path.abspath(workspace)
+        self.uses = 0
+        self.labels = labels or {}
+        self.container = None
+        self.working_dir = "/app"
+        self.installed: List[str] = []
+        self._running = set()
+        # Held while an exec registers and while the container is swapped, so no command loses its container
+        self._lock = threading.Lock()
+        settings = get_config().sandbox
+        self.wheel_cache = resolve_path(settings.wheel_cache)
+        self.image_cache = settings.image_cache
+        os.makedirs(self.host_dir, exist_ok=True)
+        os.makedirs(self.wheel_cache, exist_ok=True)
+        self.base_image = image or get_config().docker_image
+        self.image = self.base_image
         try:
-            self.client = docker.from_env()
-            self.image = "python:3.10-slim"
-            self.container = None
-            self.working_dir = "/app"
+            self.client = client or docker_client()
             self._start_persistent_container()
         except: self.client = None
 
     def _start_persistent_container(self):
-        abs_path = os.path.abspath("workspace")
         try:
             try:
-                old = self.client.containers.get("emacs-sandbox")
+                old = self.client.containers.get(self.name)
                 old.remove(force=True)
             except: pass
 
             self.container = self.client.containers.run(
                 self.image,
-                name="emacs-sandbox",
+                name=self.name,
                 command="tail -f /dev/null",
-                volumes={abs_path: {'bind': self.working_dir, 'mode': 'rw'}},
+                volumes={
+                    self.host_dir: {'bind': self.working_dir, 'mode': 'rw'},
+                    # Shared wheel cache survives container recreation
+                    self.wheel_cache: {'bind': '/root/.cache/pip', 'mode': 'rw'}
+                },
                 working_dir=self.working_dir,
+                labels=self.labels,
                 detach=True,
                 mem_limit="512m",
                 network_disabled=False
             )
-            print("📦 Sandbox Started")
+            print(f"📦 Sandbox Started ({self.name})")
         except: pass
 
-    def run_code(self, filename: str, dependencies: list = []) -> str:
-        if not self.container: return "Sandbox Not Running"
-        
-        if dependencies:
-            self.container.exec_run(f"pip install {' '.join(dependencies)}")
-        
-        cmd = f"python -u {filename}"
-        exit_code, output = self.container.exec_run(cmd)
-        
-        logs = output.decode("utf-8")
+    def is_healthy(self) -> bool:
+        if not self.container: return False
+        try:
+            self.container.reload()
+            return self.container.status == "running" and self.container.exec_run("true").exit_code == 0
+        except: return False
+
+    def reset(self):
+        """Wipe the workspace between leases (files are root-owned, so delete from inside).
+        Packages go too: the next mission starts from the base image, so undeclared imports fail."""
+        if self.client and (self.installed or self.image != self.base_image):
+            self.image = self.base_image
+            self.installed = []
+            self._start_persistent_container()
+        if self.container:
+            try:
+                self.container.exec_run(f"find {self.working_dir} -mindepth 1 -delete")
+                return
+            except: pass
+        shutil.rmtree(self.host_dir, ignore_errors=True)
+        os.makedirs(self.host_dir, exist_ok=True)
+
+    def publish(self, target: str = None):
+        """Copy generated files to the shared workspace the UI shows."""
+        target = resolve_path(target or get_config().sandbox.publish_dir)
+        if os.path.abspath(target) == self.host_dir: return
+        try: shutil.copytree(self.host_dir, target, dirs_exist_ok=True)
+        except Exception as e: print(f"⚠️ Publish failed: {e}")
+
+    def remove(self):
+        if self.container:
+            try: self.container.remove(force=True)
+            except: pass
+            self.container = None
+
+    def install(self, dependencies: List[str]) -> bool:
+        """Install packages, reusing a committed image layer for the resulting set if one exists."""
+        with span("sandbox.install", sandbox=self.name, dependencies=list(dependencies)) as s:
+            ok = self._install(dependencies)
+            s.set(ok=ok, image=self.image)
+            return ok
+
+    def _install(self, dependencies: List[str]) -> bool:
+        if not self.container: return False
+        new_deps = [d for d in dependencies if d not in self.installed]
+        if not new_deps: return True
+        target = self.installed + new_deps
+        tag = deps_image_tag(self.base_image, target)
+        if self.image_cache:
+            try:
+                cached = self.client.images.get(f"{DEPS_REPOSITORY}:{tag}")
+                with self._lock:
+                    # Parallel steps share this sandbox: only swap containers when nothing runs in it,
+                    # otherwise fall through to pip in the live container
+                    if not self._running:
+                        print(f"   📦 Reusing cached layer {DEPS_REPOSITORY}:{tag}")
+                        # Workspace is a bind mount, so recreating the container keeps the files
+                        self.image = cached.tags[0] if cached.tags else cached.id
+                        self._start_persistent_container()
+                        self.installed = target
+                        return True
+            except docker.errors.ImageNotFound: pass
+            except Exception as e: print(f"⚠️ Layer cache lookup failed: {e}")
+
+        exit_code, output = self.container.exec_run(f"pip install {' '.join(new_deps)}")
         if exit_code != 0:
-            return f"Error (Exit Code {exit_code}):\n{logs}"
-        return logs if logs else "(No Output)"
+            print(f"   ⚠️ pip install failed: {output.decode('utf-8', 'replace')[-300:]}")
+            return False
+        self.installed = target
+        if self.image_cache:
+            # pause=False: parallel steps' scripts keep running (and their wall-clock limits keep counting)
+            try:
+                self.container.commit(repository=DEPS_REPOSITORY, tag=tag, pause=False)
+                prune_deps_images(self.client, get_config().sandbox.max_cached_images)
+            except Exception as e: print(f"⚠️ Layer commit failed: {e}")
+        return True
+
+    def _exec(self, command: str, timeout: Optional[float] = None, stream: Optional[bool] = None) -> ExecResult:
+        """Run a shell command with wall-clock and CPU limits, streaming and capping its output."""
+        if not self.container: return ExecResult(reason="unavailable")
+        settings = get_config().sandbox
+        timeout = timeout or settings.exec_timeout_s
+        pidfile = f"/tmp/emacs_exec_{uuid.uuid4().hex[:12]}.pid"
+        # timeout puts the command in its own process group and signals the whole group,
+        # so subprocesses the script spawned die with it
+        script = (
+            f"oom0=$({OOM_COUNT}); "
+            # Soft CPU limit raises SIGXCPU; the hard limit a little later is the SIGKILL backstop
+            f"ulimit -S -t {settings.cpu_limit_s}; ulimit -H -t {settings.cpu_limit_s + 5}; "
+            f"timeout -k 5 {timeout:g} sh -c {shlex.quote(command)} & pid=$!; "
+            f"echo $pid > {pidfile}; wait $pid; rc=$?; rm -f {pidfile}; "
+            # Evidence for classifying a kill: the children's CPU time and OOM kills before/after
+            f"[ $rc -gt 128 ] && {{ times; echo \"$oom0 $({OOM_COUNT})\"; }} > {pidfile}.exit; exit $rc"
+        )
+        capture = OutputCapture(settings.output_head_kb * 1024, settings.output_tail_kb * 1024)
+        echo = _LineEcho(settings.stream_max_lines) if (settings.stream_output if stream is None else stream) else None
+        killed = threading.Event()
+
+        def _kill_group():
+            # Backstop for when the in-container timeout itself is stuck
+            killed.set()
+            self._kill(pidfile)
+
+        watchdog = threading.Timer(timeout + 15, _kill_group)
+        start = time.monotonic()
+        try:
+            with self._lock:
+                self._running.add(pidfile)
+                exec_id = self.client.api.exec_create(self.container.id, ["sh", "-c", script], workdir=self.working_dir)["Id"]
+            watchdog.start()
+            for stdout, stderr in self.client.api.exec_start(exec_id, stream=True, demux=True):
+                for name, chunk in (("stdout", stdout), ("stderr", stderr)):
+                    if not chunk: continue
+                    capture.write(chunk)
+                    if echo: echo.write(name, chunk)
+            exit_code = self.client.api.exec_inspect(exec_id).get("ExitCode")
+        except Exception as e:
+            # The command may still be running in the container; don't leave it behind
+            self._kill(pidfile)
+            return ExecResult(exit_code=-1, reason="error", duration_s=time.monotonic() - start,
+                              output=f"Sandbox exec failed: {e}")
+        finally:
+            self._running.discard(pidfile)
+            watchdog.cancel()
+            if echo: echo.flush()
+        duration = time.monotonic() - start
+        cpu_s, oom_killed = self._kill_evidence(pidfile) if exit_code and exit_code > 128 else (None, False)
+        reason, sig = classify_exit(exit_code, killed.is_set(), duration, timeout, cpu_s, settings.cpu_limit_s, oom_killed)
+        return ExecResult(exit_code=exit_code, reason=reason, signal=sig, duration_s=round(duration, 3),
+                          output=capture.text(), truncated_bytes=capture.dropped)
+
+    def _kill_evidence(self, pidfile: str) -> tuple:
+        """(CPU seconds, OOM-killed?) recorded by the exec script when its command died from a signal."""
+        try:
+            out = self.container.exec_run(["sh", "-c", f"cat {pidfile}.exit; rm -f {pidfile}.exit"]).output.decode("utf-8", "replace")
+            # `times` prints the shell's own times, then its children's; the OOM counts follow
+            lines = out.splitlines()
+            counts = lines[2].split() if len(lines) > 2 else []
+            oom_killed = len(counts) == 2 and int(counts[1]) > int(counts[0])
+            return (_cpu_seconds(lines[1]) if len(lines) > 1 else None), oom_killed
+        except Exception: return None, False
+
+    def _kill(self, pidfile: str):
+        try: self.container.exec_run(["sh", "-c", f"kill -KILL -- -$(cat {pidfile}) 2>/dev/null"])
+        except Exception: pass
+
+    def kill_running(self):
+        """Kill every command currently started through _exec, with its child processes."""
+        for pidfile in list(self._running): self._kill(pidfile)
+
+    def execute(self, filename: str, dependencies: list = [], timeout: Optional[float] = None) -> ExecResult:
+        if not self.container: return ExecResult(reason="unavailable")
+
+        if dependencies:
+            self.install(dependencies)
+
+        with span("sandbox.run_code", sandbox=self.name, filename=filename) as s:
+            result = self._exec(f"python -u {shlex.quote(filename)}", timeout)
+            s.set(exit_code=result.exit_code, reason=result.reason, duration_s=result.duration_s,
+                  output_bytes=len(result.output), truncated_bytes=result.truncated_bytes)
+        return result
+
+    def run_code(self, filename: str, dependencies: list = []) -> str:
+        return self.execute(filename, dependencies).as_log()
 
     def run_shell(self, command: str) -> str:
         if not self.container: return "Sandbox Not Running"
-        exit_code, output = self.container.exec_run(command)
-        return output.decode("utf-8")
+        with span("sandbox.run_shell", sandbox=self.name, command=command[:200]) as s:
+            result = self._exec(command, stream=False)
+            s.set(exit_code=result.exit_code, reason=result.reason, output_bytes=len(result.output))
+        return result.output
+
+class SandboxPool:
+    """Pre-started sandbox containers, each with its own workspace, leased out per mission."""
+    def __init__(self, size: int = 2, max_uses: int = 20, workspace_root: str = "./sandboxes", image: str = None):
+        self.size = size
+        self.max_uses = max_uses
+        self.workspace_root = resolve_path(workspace_root)
+        self.image = image
+        self._idle: "queue.Queue[DockerSandbox]" = queue.Queue()
+        self._slots: List[DockerSandbox] = []
+        try: self.client = docker_client()
+        except: self.client = None
+        self._remove_stale()
+        if self.client: prune_deps_images(self.client, get_config().sandbox.max_cached_images)
+        threads = [threading.Thread(target=lambda i=i: self._idle.put(self._create(i))) for i in range(size)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+    def _create(self, slot: int) -> DockerSandbox:
+        name = f"emacs-sandbox-{os.getpid()}-{slot}"
+        sb = DockerSandbox(name=name, workspace=os.path.join(self.workspace_root, name), image=self.image,
+                           client=self.client, labels={POOL_LABEL: str(os.getpid())})
+        sb.slot = slot
+        self._slots.append(sb)
+        return sb
+
+    def _remove_stale(self):
+        # Containers left behind by pool owners that no longer exist
+        if not self.client: return
+        try:
+            for c in self.client.containers.list(all=True, filters={"label": POOL_LABEL}):
+                pid = int(c.labels.get(POOL_LABEL, "0"))
+                try: os.kill(pid, 0)
+                except OSError:
+                    c.remove(force=True)
+                    shutil.rmtree(os.path.join(self.workspace_root, c.name), ignore_errors=True)
+        except: pass
+
+    def _recycle(self, sb: DockerSandbox) -> DockerSandbox:
+        print(f"♻️ Recycling {sb.name} (uses: {sb.uses})")
+        sb.remove()
+        self._slots.remove(sb)
+        fresh = self._create(sb.slot)
+        fresh.reset()
+        return fresh
+
+    def acquire(self, timeout: Optional[float] = None) -> DockerSandbox:
+        sb = self._idle.get(timeout=timeout)
+        if self.client and not sb.is_healthy(): sb = self._recycle(sb)
+        sb.uses += 1
+        return sb
+
+    def release(self, sb: DockerSandbox):
+        # Reset off the caller's critical path; the slot returns to the pool when clean
+        def _return():
+            fresh = self._recycle(sb) if self.client and sb.uses >= self.max_uses else sb
+            if fresh is sb: sb.reset()
+            self._idle.put(fresh)
+        threading.Thread(target=_return, daemon=True).start()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        sb = self.acquire(timeout)
+        try: yield sb
+        finally: self.release(sb)
+
+    def shutdown(self):
+        for sb in list(self._slots): sb.remove()
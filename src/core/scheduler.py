@@ -0,0 +1,79 @@
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Set, TypeVar
+from src.core.models import Step
+
+R = TypeVar("R")
+
+def _sequential(steps: List[Step]) -> Dict[int, Set[int]]:
+    return {s.id: ({steps[i - 1].id} if i else set()) for i, s in enumerate(steps)}
+
+def resolve_dependencies(steps: List[Step]) -> Dict[int, Set[int]]:
+    """Map step id -> ids it waits for. Falls back to plain ordering on bad input."""
+    ids = [s.id for s in steps]
+    if len(set(ids)) != len(ids): return _sequential(steps)
+    deps = {}
+    for i, s in enumerate(steps):
+        if s.depends_on is None:
+            deps[s.id] = {steps[i - 1].id} if i else set()
+        else:
+            deps[s.id] = {d for d in s.depends_on if d in ids} - {s.id}
+    # Reject cycles rather than deadlocking on them
+    if sum(len(w) for w in execution_waves(steps, deps)) != len(steps):
+        print("⚠️ Cyclic step dependencies. Falling back to sequential order.")
+        return _sequential(steps)
+    return deps
+
+def ancestors(deps: Dict[int, Set[int]]) -> Dict[int, Set[int]]:
+    """Map step id -> every step it transitively waits for."""
+    out: Dict[int, Set[int]] = {}
+    def visit(sid: int) -> Set[int]:
+        if sid not in out:
+            out[sid] = set()
+            for d in deps.get(sid, ()): out[sid] |= {d} | visit(d)
+        return out[sid]
+    for sid in deps: visit(sid)
+    return out
+
+def execution_waves(steps: List[Step], deps: Dict[int, Set[int]]) -> List[List[Step]]:
+    """Group steps into waves whose members only depend on earlier waves (plan order kept)."""
+    done: Set[int] = set()
+    pending = list(steps)
+    waves = []
+    while pending:
+        ready = [s for s in pending if deps[s.id] <= done]
+        if not ready: break
+        waves.append(ready)
+        done.update(s.id for s in ready)
+        pending = [s for s in pending if s.id not in done]
+    return waves
+
+def run_as_ready(steps: List[Step], deps: Dict[int, Set[int]], worker: Callable[[Step], R], max_workers: int,
+                 ok: Callable[[R], bool] = bool) -> Dict[int, R]:
+    """Start each step as soon as the steps it depends on finish, at most max_workers at a time (plan order breaks ties).
+    Nothing new starts once a result fails `ok` or a worker raises; running steps finish first.
+    Returns step id -> result for the steps that ran; a worker's exception is re-raised at the end."""
+    ids = {s.id for s in steps}
+    # Dependencies outside `steps` (e.g. finished before a resume) are already satisfied
+    waiting = {s.id: deps[s.id] & ids for s in steps}
+    pending, running, results = list(steps), {}, {}
+    error, stopped = None, False
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while True:
+            if not stopped:
+                ready = [s for s in pending if waiting[s.id] <= results.keys()]
+                for s in ready[:max(1, max_workers) - len(running)]:
+                    pending.remove(s)
+                    # Each task gets its own copy of the caller's context (e.g. the leased sandbox)
+                    running[pool.submit(contextvars.copy_context().run, worker, s)] = s
+            if not running: break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(finished, key=lambda f: steps.index(running[f])):
+                step = running.pop(future)
+                try: results[step.id] = future.result()
+                except BaseException as e:
+                    error, stopped = error or e, True
+                    continue
+                if not ok(results[step.id]): stopped = True
+    if error is not None: raise error
+    return results
@@ -0,0 +1,153 @@
+import atexit
+import base64
+import contextvars
+import datetime
+import functools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import requests
+from src.core.config import get_config, resolve_path
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.id if parent else None
+        self.name = name
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id, "span_id": self.id, "parent_id": self.parent_id,
+            "name": self.name, "start": self.start, "end": self.end,
+            "duration_ms": round((self.end - self.start) * 1000, 2) if self.end else None,
+            "status": self.status, "attributes": self.attributes,
+        }
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for s in spans: f.write(json.dumps(s.to_dict(), default=str, ensure_ascii=False) + "\n")
+
+class LangfuseExporter:
+    """Posts spans to a Langfuse-compatible /api/public/ingestion endpoint."""
+    def __init__(self, host: str, public_key: str, secret_key: str):
+        self.url = host.rstrip("/") + "/api/public/ingestion"
+        token = base64.b64encode(f"{public_key}:{secret_key}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {token}"}
+        self._warned = False
+
+    @staticmethod
+    def _iso(ts: float) -> str:
+        return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+    def export(self, spans: List[Span]):
+        batch = []
+        for s in spans:
+            if s.parent_id is None:
+                batch.append({"id": uuid.uuid4().hex, "timestamp": self._iso(s.start), "type": "trace-create",
+                              "body": {"id": s.trace_id, "name": s.name, "metadata": s.attributes}})
+            is_llm = s.name.startswith("llm.")
+            body = {
+                "id": s.id, "traceId": s.trace_id, "parentObservationId": s.parent_id, "name": s.name,
+                "startTime": self._iso(s.start), "endTime": self._iso(s.end or s.start),
+                "metadata": s.attributes, "level": "ERROR" if s.status == "error" else "DEFAULT",
+            }
+            if is_llm:
+                body["model"] = s.attributes.get("model")
+                body["usage"] = {"input": s.attributes.get("prompt_tokens"), "output": s.attributes.get("completion_tokens")}
+            batch.append({"id": uuid.uuid4().hex, "timestamp": self._iso(s.start),
+                          "type": "generation-create" if is_llm else "span-create", "body": body})
+        try:
+            requests.post(self.url, json={"batch": batch}, headers=self.headers, timeout=5).raise_for_status()
+        except Exception as e:
+            if not self._warned: print(f"⚠️ Langfuse export failed: {e}")
+            self._warned = True
+
+class Tracer:
+    """Collects finished spans and exports them in batches from a background thread."""
+    def __init__(self, exporters: list):
+        self.exporters = exporters
+        self._queue: "queue.Queue[Span]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, span: Span):
+        self._queue.put(span)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < 100: batch.append(self._queue.get_nowait())
+            except queue.Empty: pass
+            for exporter in self.exporters:
+                try: exporter.export(batch)
+                except Exception as e: print(f"⚠️ Trace export failed: {e}")
+            for _ in batch: self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Optional[Tracer]:
+    global _tracer
+    settings = get_config().tracing
+    if not settings.enabled: return None
+    with _tracer_lock:
+        if _tracer is None:
+            exporters = [JsonlExporter(resolve_path(settings.jsonl_path))]
+            pk, sk = os.environ.get("LANGFUSE_PUBLIC_KEY"), os.environ.get("LANGFUSE_SECRET_KEY")
+            if settings.langfuse_enabled and pk and sk:
+                exporters.append(LangfuseExporter(os.environ.get("LANGFUSE_HOST", settings.langfuse_host), pk, sk))
+            _tracer = Tracer(exporters)
+    return _tracer
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+@contextmanager
+def span(name: str, **attributes):
+    """Open a span nested under the current one; exceptions mark it as failed and propagate."""
+    s = Span(name, _current.get(), attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.set(error=f"{type(e).__name__}: {e}"[:500])
+        raise
+    finally:
+        _current.reset(token)
+        s.end = time.time()
+        tracer = get_tracer()
+        if tracer: tracer.submit(s)
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with span(name): return func(*args, **kwargs)
+        return inner
+    return wrap
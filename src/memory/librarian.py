@@ -1,27 +1,162 @@
 import chromadb
+import hashlib
+import numpy as np
 import os
+import queue
+import threading
 import datetime
-from src.core.config import load_config
+from typing import List, Optional, Sequence
+from chromadb.utils import embedding_functions
+from src.core.config import get_config, load_config, resolve_path
+from src.core.tracing import span
+
+def content_hash(code: str) -> str:
+    """Hash of code with whitespace-only differences normalised away."""
+    lines = [line.rstrip() for line in code.strip().splitlines()]
+    normalized = "\n".join(line for line in lines if line)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def similarity(distance: float) -> float:
+    """Cosine similarity from Chroma's default squared-L2 distance (embeddings are unit length)."""
+    return max(0.0, 1.0 - distance / 2)
+
+def now_iso() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+def skill_objective(document: str, meta: dict) -> str:
+    if meta.get("objective"): return meta["objective"]
+    first = document.split("\n", 1)[0]
+    return first[len("Objective: "):] if first.startswith("Objective: ") else first
+
+def skill_code(document: str) -> Optional[str]:
+    """The stored program of a skill document ("Objective: ...\nCode:\n<code>")."""
+    _, sep, code = document.partition("\nCode:\n")
+    return code if sep and code.strip() else None
+
 class Librarian:
-    def __init__(self):
-        os.makedirs("chroma_db", exist_ok=True)
-        self.client = chromadb.PersistentClient(path="./chroma_db")
-        self.collection = self.client.get_or_create_collection("emacs_skills")
+    def __init__(self, batch_size: int = 16):
+        db_path = resolve_path(get_config().memory.chroma_path)
+        os.makedirs(db_path, exist_ok=True)
+        self.client = chromadb.PersistentClient(path=db_path)
+        # Chroma's default, held on to so recall can embed objectives too
+        self.embed = embedding_functions.DefaultEmbeddingFunction()
+        self.collection = self.client.get_or_create_collection("emacs_skills", embedding_function=self.embed)
         config = load_config()
-        self.obsidian_path = config.get("obsidian_vault_path", "./memory_logs")
+        self.obsidian_path = resolve_path(config.get("obsidian_vault_path", "./memory_logs"))
         os.makedirs(self.obsidian_path, exist_ok=True)
+        # Write-behind: memorize() only enqueues, a worker batches the embedding + disk work
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[dict]" = queue.Queue()
+        self._seen: set = set()
+        self._seen_lock = threading.Lock()
+        self._meta_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._drain, daemon=True)
+        self._worker.start()
+
     def recall(self, query: str) -> str:
+        skill = self.recall_skill(query)
+        return skill["document"] if skill else ""
+
+    def recall_skill(self, query: str, min_match: float = 0.0) -> Optional[dict]:
+        """Closest skill as {id, document, metadata, distance, similarity}; counts as a recall hit.
+        With min_match, the query is also scored against each candidate's stored objective ("match"): documents
+        include code, which dilutes their similarity. Only a candidate reaching min_match is returned."""
+        with span("memory.recall", query_chars=len(query), min_match=min_match or None) as s:
+            try:
+                res = self.collection.query(query_texts=[query], n_results=3 if min_match else 1)
+                ids = res["ids"][0] if res["ids"] else []
+                candidates = [{"id": ids[i], "document": res["documents"][0][i], "metadata": res["metadatas"][0][i] or {},
+                               "distance": res["distances"][0][i], "similarity": similarity(res["distances"][0][i])}
+                              for i in range(len(ids))]
+                if min_match and candidates: candidates = self._match(query, candidates, min_match)
+                skill = candidates[0] if candidates else None
+            except Exception: skill = None
+            s.set(result_chars=len(skill["document"]) if skill else 0, similarity=round(skill["similarity"], 3) if skill else None,
+                  match=round(skill["match"], 3) if skill and "match" in skill else None)
+            if skill: self._update_meta(skill["id"], lambda m: {"recalls": m.get("recalls", 0) + 1, "last_recalled_at": now_iso()})
+            return skill
+
+    def _match(self, query: str, candidates: List[dict], min_match: float) -> List[dict]:
+        vectors = np.asarray(self.embed([query] + [skill_objective(c["document"], c["metadata"]) for c in candidates]), dtype=float)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        for c, v in zip(candidates, vectors[1:]): c["match"] = float(vectors[0] @ v)
+        return sorted((c for c in candidates if c["match"] >= min_match), key=lambda c: c["match"], reverse=True)
+
+    def record_outcome(self, skill_ids: List[str], passed: bool):
+        """Downstream verdict for skills that were recalled into a mission's context."""
+        key = "successes" if passed else "failures"
+        for skill_id in dict.fromkeys(skill_ids): self._update_meta(skill_id, lambda m: {key: m.get(key, 0) + 1})
+
+    def _update_meta(self, skill_id: str, change):
         try:
-            res = self.collection.query(query_texts=[query], n_results=1)
-            return res['documents'][0][0] if res['documents'] else ""
-        except: return ""
-    def memorize(self, objective: str, code: str, filename: str, lesson: str = ""):
+            with self._meta_lock:
+                res = self.collection.get(ids=[skill_id], include=["metadatas"])
+                if not res["ids"]: return
+                meta = dict(res["metadatas"][0] or {})
+                meta.update(change(meta))
+                self.collection.update(ids=[skill_id], metadatas=[meta])
+        except Exception as e: print(f"⚠️ Librarian metadata update failed: {e}")
+
+    def note_path(self, objective: str, digest: str) -> str:
+        safe_name = "".join([c for c in objective[:30] if c.isalnum()]).strip() or "skill"
+        # Content hash suffix keeps same-prefix objectives from overwriting each other
+        return os.path.join(self.obsidian_path, f"{safe_name}_{digest[:8]}.md")
+
+    def forget(self, hashes: List[str]):
+        """Let memorize() store these again (after maintenance removed them)."""
+        with self._seen_lock: self._seen.difference_update(hashes)
+
+    def memorize(self, objective: str, code: str, filename: str, lesson: str = "", dependencies: Sequence[str] = ()):
+        with span("memory.memorize", filename=filename, code_chars=len(code)) as s:
+            self._enqueue(objective, code, filename, lesson, list(dependencies), s)
+
+    def _enqueue(self, objective: str, code: str, filename: str, lesson: str, dependencies: List[str], s):
+        digest = content_hash(code)
+        with self._seen_lock:
+            if digest in self._seen:
+                s.set(duplicate=True)
+                return
+            self._seen.add(digest)
+        s.set(duplicate=False)
+        self._queue.put({"id": f"skill_{digest[:24]}", "hash": digest, "objective": objective,
+                         "code": code, "filename": filename, "lesson": lesson, "dependencies": dependencies})
+
+    def flush(self, timeout: float = None):
+        """Block until every queued skill is stored (call at mission end)."""
+        if timeout is None:
+            self._queue.join()
+            return
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        if not done.wait(timeout): print(f"⚠️ Librarian flush timed out ({self._queue.qsize()} pending)")
+
+    def _drain(self):
+        while True:
+            batch = [self._queue.get()]
+            # Batch whatever piled up while the previous write was embedding; never wait for more
+            try:
+                while len(batch) < self.batch_size: batch.append(self._queue.get_nowait())
+            except queue.Empty: pass
+            try:
+                with span("memory.store", batch_size=len(batch)): self._store(batch)
+            except Exception as e:
+                print(f"⚠️ Librarian write failed: {e}")
+                # Forget the hashes so a later memorize() can retry them
+                with self._seen_lock: self._seen.difference_update(item["hash"] for item in batch)
+            finally:
+                for _ in batch: self._queue.task_done()
+
+    def _store(self, batch: list):
+        existing = set(self.collection.get(ids=[e["id"] for e in batch])["ids"])
+        fresh = [e for e in batch if e["id"] not in existing]
+        if not fresh: return
         self.collection.add(
-            documents=[f"Objective: {objective}\nCode:\n{code}"],
-            metadatas=[{"filename": filename}],
-            ids=[f"{filename}_{os.urandom(4).hex()}"]
+            documents=[f"Objective: {e['objective']}\nCode:\n{e['code']}" for e in fresh],
+            metadatas=[{"filename": e["filename"], "content_hash": e["hash"], "objective": e["objective"][:500],
+                        "dependencies": ",".join(e["dependencies"]),
+                        "created_at": now_iso(), "recalls": 0, "successes": 0, "failures": 0} for e in fresh],
+            ids=[e["id"] for e in fresh]
         )
-        safe_name = "".join([c for c in objective[:30] if c.isalnum()]).strip() or "skill"
-        path = os.path.join(self.obsidian_path, f"{safe_name}.md")
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(f"# {objective}\n```python\n{code}\n```\n> {lesson}")
+        for e in fresh:
+            with open(self.note_path(e["objective"], e["hash"]), "w", encoding="utf-8") as f:
+                f.write(f"# {e['objective']}\n```python\n{e['code']}\n```\n> {e['lesson']}")
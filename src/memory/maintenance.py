@@ -0,0 +1,142 @@
+"""Skill-store upkeep: merge near-duplicates, evict the least useful past capacity, prune dead-end FAIL_ notes, rebuild INDEX.md."""
+import datetime
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from src.core.config import get_config
+from src.core.tracing import span
+from src.memory.librarian import Librarian, skill_objective
+
+INDEX_NOTE = "INDEX.md"
+STDLIB = set(sys.stdlib_module_names)
+# Analyses that learned nothing about the task itself
+DEAD_END = [re.compile(p, re.IGNORECASE) for p in (
+    r"\blogs? (?:are|is|were) empty\b",
+    r"\bno (?:logs?|output) (?:was |were )?(?:provided|captured)\b",
+)]
+INSTALL_WORDS = re.compile(r"\b(?:pip|install\w*|not found|no module named|cannot be found)\b", re.IGNORECASE)
+QUOTED = re.compile(r"[`'\"](\w+)[`'\"]")
+LESSON = re.compile(r"^>\s*(?:\*\*Lesson:\*\*)?\s*(.*)", re.MULTILINE)
+
+def _timestamp(value: Optional[str]) -> float:
+    try: return datetime.datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError): return 0.0
+
+def usefulness(meta: dict, now: float) -> tuple:
+    """Sort key, least useful first: never useful, then stale, then smoothed pass rate, then recency."""
+    settings = get_config().memory
+    successes, failures = meta.get("successes", 0), meta.get("failures", 0)
+    last_used = _timestamp(meta.get("last_recalled_at") or meta.get("created_at"))
+    never_useful = meta.get("recalls", 0) >= settings.min_recalls and successes == 0
+    stale = now - last_used > settings.stale_days * 86400
+    return (not never_useful, not stale, (successes + 1) / (successes + failures + 2), last_used)
+
+def _merged_meta(kept: dict, dupe: dict) -> dict:
+    meta = dict(kept)
+    for key in ("recalls", "successes", "failures"): meta[key] = kept.get(key, 0) + dupe.get(key, 0)
+    meta["created_at"] = min(filter(None, (kept.get("created_at"), dupe.get("created_at"))), default="")
+    last = max(filter(None, (kept.get("last_recalled_at"), dupe.get("last_recalled_at"))), default=None)
+    if last: meta["last_recalled_at"] = last
+    return meta
+
+def find_duplicates(embeddings, order: List[int], threshold: float) -> Dict[int, int]:
+    """duplicate index -> index it merges into; earlier entries in `order` survive."""
+    vectors = np.asarray(embeddings, dtype=float)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    sims = vectors @ vectors.T
+    kept, merged = [], {}
+    for i in order:
+        target = next((k for k in kept if sims[i, k] >= threshold), None)
+        if target is None: kept.append(i)
+        else: merged[i] = target
+    return merged
+
+def useless_failure(text: str) -> Optional[str]:
+    """Why a FAIL_ note teaches nothing, or None if it may be worth keeping."""
+    lessons = [m.strip() for m in LESSON.findall(text) if m.strip()]
+    if not lessons: return "no lesson"
+    if any(p.search(text) for p in DEAD_END): return "no signal in the logs"
+    if INSTALL_WORDS.search(text):
+        stdlib = sorted({m for m in QUOTED.findall(text) if m in STDLIB})
+        if stdlib: return f"blames installing stdlib module(s) {', '.join(stdlib)}"
+    return None
+
+def prune_failure_notes(vault: str, dry_run: bool = False) -> List[str]:
+    pruned, seen = [], set()
+    for name in sorted(os.listdir(vault)):
+        if not (name.startswith("FAIL_") and name.endswith(".md")): continue
+        path = os.path.join(vault, name)
+        with open(path, encoding="utf-8", errors="replace") as f: text = f.read()
+        reason = useless_failure(text)
+        lesson = " ".join(re.sub(r"[^a-z0-9 ]", "", " ".join(LESSON.findall(text)).lower()).split())
+        if not reason and lesson in seen: reason = "duplicate lesson"
+        seen.add(lesson)
+        if not reason: continue
+        print(f"   🗑️ {name}: {reason}")
+        pruned.append(name)
+        if not dry_run: os.remove(path)
+    return pruned
+
+def rebuild_index(lib: Librarian, skills: List[dict]) -> str:
+    """INDEX.md linking every note in the vault; skills carry their recall and pass counts."""
+    vault = lib.obsidian_path
+    notes = sorted(n for n in os.listdir(vault) if n.endswith(".md") and n != INDEX_NOTE)
+    stats = {os.path.basename(s["path"]): s["meta"] for s in skills}
+    skill_lines, fail_lines, other_lines = [], [], []
+    for name in notes:
+        link = f"- [[{name[:-3]}]]"
+        if name.startswith("FAIL_"): fail_lines.append(link)
+        elif name in stats:
+            m = stats[name]
+            skill_lines.append(f"{link} — {m.get('recalls', 0)} recalls, {m.get('successes', 0)} passed / {m.get('failures', 0)} failed")
+        else: other_lines.append(link)
+    sections = [("Skills", skill_lines), ("Failures", fail_lines), ("Other notes", other_lines)]
+    body = "\n\n".join(f"## {title}\n" + "\n".join(lines) for title, lines in sections if lines)
+    path = os.path.join(vault, INDEX_NOTE)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# Skill Index\n_Rebuilt {datetime.datetime.now().isoformat(timespec='seconds')}: "
+                f"{len(skill_lines)} skills, {len(fail_lines)} failure notes_\n\n{body}\n")
+    return path
+
+def maintain(lib: Librarian, dry_run: bool = False) -> dict:
+    """Compact the skill collection and the vault. dry_run reports what would change without changing it."""
+    settings = get_config().memory
+    with span("memory.maintain", dry_run=dry_run) as s:
+        lib.flush()
+        res = lib.collection.get(include=["documents", "metadatas", "embeddings"])
+        ids, docs = res["ids"], res["documents"]
+        metas = [dict(m or {}) for m in res["metadatas"]]
+        now = time.time()
+        # Most useful first: it survives merges and eviction
+        order = sorted(range(len(ids)), key=lambda i: usefulness(metas[i], now), reverse=True)
+        merged = find_duplicates(res["embeddings"], order, settings.merge_similarity) if ids else {}
+        for dupe, kept in merged.items(): metas[kept] = _merged_meta(metas[kept], metas[dupe])
+        survivors = sorted((i for i in order if i not in merged), key=lambda i: usefulness(metas[i], now), reverse=True)
+        evicted = survivors[settings.capacity:]
+        survivors = survivors[:settings.capacity]
+        removed = list(merged) + evicted
+
+        skills = [{"id": ids[i], "meta": metas[i], "path": lib.note_path(skill_objective(docs[i], metas[i]), metas[i].get("content_hash", ids[i][6:]))}
+                  for i in survivors]
+        if not dry_run:
+            merged_into = sorted(set(merged.values()) - set(evicted))
+            if merged_into: lib.collection.update(ids=[ids[i] for i in merged_into], metadatas=[metas[i] for i in merged_into])
+            if removed:
+                lib.collection.delete(ids=[ids[i] for i in removed])
+                lib.forget([metas[i].get("content_hash", "") for i in removed])
+                for i in removed:
+                    path = lib.note_path(skill_objective(docs[i], metas[i]), metas[i].get("content_hash", ids[i][6:]))
+                    if os.path.exists(path): os.remove(path)
+        pruned = prune_failure_notes(lib.obsidian_path, dry_run)
+        index = rebuild_index(lib, skills) if not dry_run else None
+        report = {"skills": len(survivors), "merged": len(merged), "evicted": len(evicted), "pruned_notes": len(pruned), "index": index}
+        s.set(**{k: v for k, v in report.items() if k != "index"})
+        print(f"🧹 Memory maintenance{' (dry run)' if dry_run else ''}: {len(merged)} merged, {len(evicted)} evicted, "
+              f"{len(pruned)} FAIL notes pruned, {len(survivors)} skills kept")
+        return report
+
+if __name__ == "__main__":
+    maintain(Librarian(), dry_run="--dry-run" in sys.argv)
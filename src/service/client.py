@@ -0,0 +1,50 @@
+import time
+from typing import Iterator
+import requests
+from src.core.config import get_config
+
+class MissionClient:
+    """Thin HTTP client for the mission worker service."""
+    def __init__(self, base_url: str = None, timeout: float = 5):
+        settings = get_config().service
+        self.base_url = (base_url or f"http://{settings.host}:{settings.port}").rstrip("/")
+        self.timeout = timeout
+
+    def _get(self, path: str, **params):
+        res = requests.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        res.raise_for_status()
+        return res.json()
+
+    def _post(self, path: str, payload: dict = None):
+        res = requests.post(f"{self.base_url}{path}", json=payload or {}, timeout=self.timeout)
+        res.raise_for_status()
+        return res.json()
+
+    def is_alive(self) -> bool:
+        try: return bool(self._get("/health").get("ok"))
+        except requests.RequestException: return False
+
+    def submit(self, objective: str = None, resume: str = None) -> dict:
+        return self._post("/missions", {"resume": resume} if resume else {"objective": objective})
+
+    def status(self, job_id: str) -> dict:
+        return self._get(f"/missions/{job_id}")
+
+    def list(self) -> list:
+        return self._get("/missions")
+
+    def cancel(self, job_id: str) -> dict:
+        return self._post(f"/missions/{job_id}/cancel")
+
+    def read_log(self, job_id: str, offset: int = 0) -> dict:
+        return self._get(f"/missions/{job_id}/log", offset=offset)
+
+    def follow(self, job_id: str, poll: float = 1.0) -> Iterator[str]:
+        """Yield log text as it is written until the job reaches a terminal state."""
+        offset = 0
+        while True:
+            chunk = self.read_log(job_id, offset)
+            offset = chunk["offset"]
+            if chunk["text"]: yield chunk["text"]
+            elif chunk["status"] in ("done", "failed", "cancelled"): return
+            else: time.sleep(poll)
@@ -0,0 +1,196 @@
+"""Long-lived mission worker: keeps clients warm and runs missions from a local HTTP job queue."""
+import argparse
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+from pydantic import BaseModel
+from src.core.config import get_config, resolve_path
+
+TERMINAL = {"done", "failed", "cancelled"}
+
+class MissionBusy(Exception):
+    """A job for this mission is already queued or running."""
+
+class Job(BaseModel):
+    id: str
+    objective: str
+    mission_id: str # Checkpoint id; differs from id when the job resumes an earlier mission
+    resume: bool = False
+    status: str = "queued" # queued | running | done | failed | cancelled
+    result: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    log_path: str
+
+_job_log: contextvars.ContextVar = contextvars.ContextVar("job_log", default=None)
+
+class _RoutedStdout:
+    """sys.stdout replacement that sends each mission's prints to its own log file."""
+    def __init__(self, fallback):
+        self.fallback = fallback
+    def write(self, text: str):
+        return (_job_log.get() or self.fallback).write(text)
+    def flush(self):
+        (_job_log.get() or self.fallback).flush()
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+class MissionService:
+    def __init__(self, max_concurrency: int = 2, log_dir: str = "./logs/missions"):
+        self.max_concurrency = max_concurrency
+        self.log_dir = resolve_path(log_dir)
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.jobs: Dict[str, Job] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        # The pool size is the concurrency limit; extra jobs wait in its queue
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="mission")
+        self.lib = None
+
+    def warm_up(self):
+        """Create the expensive clients once for every mission this process will run."""
+        from src.core.backends import get_backend_pool
+        from src.core.llm import get_cache
+        from src.memory.librarian import Librarian
+        from src.tools.custom_tools import get_sandbox_pool
+        print("🔥 Warming up: ChromaDB, sandbox pool, LLM backends...")
+        self.lib = Librarian()
+        if get_config().memory.maintain_on_start:
+            from src.memory.maintenance import maintain
+            maintain(self.lib)
+        get_sandbox_pool()
+        get_backend_pool()
+        get_cache()
+        sys.stdout = _RoutedStdout(sys.stdout)
+        print("✅ Worker ready")
+
+    def submit(self, objective: str = None, resume: str = None) -> Optional[Job]:
+        job_id = uuid.uuid4().hex[:12]
+        if resume:
+            from src.core.checkpoint import Checkpoint
+            checkpoint = Checkpoint.load(resume)
+            if checkpoint is None: return None
+            objective = checkpoint.state.objective
+        job = Job(id=job_id, objective=objective, mission_id=resume or job_id, resume=bool(resume), created_at=time.time(),
+                  log_path=os.path.join(self.log_dir, f"{job_id}.log"))
+        with self._lock:
+            # Two jobs on one mission would both write its checkpoint
+            if resume and any(j.mission_id == resume and j.status not in TERMINAL for j in self.jobs.values()):
+                raise MissionBusy(f"Mission {resume} is already queued or running")
+            self.jobs[job_id] = job
+            self._cancel[job_id] = threading.Event()
+        open(job.log_path, "w", encoding="utf-8").close()
+        self._executor.submit(self._run, job_id)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if not job: return None
+        self._cancel[job_id].set()
+        if job.status == "queued": self._finish(job, "cancelled", "Cancelled before start")
+        return job
+
+    def read_log(self, job_id: str, offset: int = 0, max_bytes: int = 65536):
+        job = self.jobs.get(job_id)
+        if not job: return None
+        try:
+            with open(job.log_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(max_bytes)
+        except OSError: chunk = b""
+        return {"offset": offset + len(chunk), "text": chunk.decode("utf-8", "replace"), "status": job.status}
+
+    def _finish(self, job: Job, status: str, result: str, log=None):
+        # The closing line is written before the status turns terminal, so follow() never stops short of it
+        if log: log.write(f"🏁 {status}: {result}\n")
+        job.status, job.result, job.finished_at = status, result, time.time()
+
+    def _run(self, job_id: str):
+        from src.core.orchestrator import MissionCancelled, run_mission
+        job = self.jobs[job_id]
+        if job.status in TERMINAL: return
+        job.status, job.started_at = "running", time.time()
+        with open(job.log_path, "a", encoding="utf-8", buffering=1) as log:
+            token = _job_log.set(log)
+            try:
+                result = run_mission(job.objective, lib=self.lib, cancel=self._cancel[job_id],
+                                     mission_id=job.mission_id, resume=job.resume)
+                self._finish(job, "failed" if result.startswith("Failed") else "done", result, log)
+            except MissionCancelled as e:
+                self._finish(job, "cancelled", str(e), log)
+            except Exception as e:
+                traceback.print_exc(file=log)
+                self._finish(job, "failed", f"Crashed: {e}", log)
+            finally:
+                _job_log.reset(token)
+
+def _make_handler(service: MissionService):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args): pass
+
+        def _send(self, code: int, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                from src.core.backends import get_backend_pool
+                return self._send(200, {"ok": True, "jobs": len(service.jobs), "max_concurrency": service.max_concurrency,
+                                        "llm_backends": get_backend_pool().stats()})
+            if url.path == "/missions":
+                return self._send(200, [j.model_dump() for j in sorted(service.jobs.values(), key=lambda j: j.created_at, reverse=True)])
+            m = re.fullmatch(r"/missions/(\w+)(/log)?", url.path)
+            if not m or m.group(1) not in service.jobs: return self._send(404, {"error": "Unknown mission"})
+            if m.group(2):
+                offset = int(parse_qs(url.query).get("offset", ["0"])[0])
+                return self._send(200, service.read_log(m.group(1), offset))
+            return self._send(200, service.jobs[m.group(1)].model_dump())
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if url.path == "/missions":
+                if body.get("resume"):
+                    try: job = service.submit(resume=body["resume"])
+                    except MissionBusy as e: return self._send(409, {"error": str(e)})
+                    if not job: return self._send(404, {"error": "Unknown checkpoint"})
+                    return self._send(202, job.model_dump())
+                if not body.get("objective"): return self._send(400, {"error": "objective or resume is required"})
+                return self._send(202, service.submit(body["objective"]).model_dump())
+            m = re.fullmatch(r"/missions/(\w+)/cancel", url.path)
+            job = service.cancel(m.group(1)) if m else None
+            if not job: return self._send(404, {"error": "Unknown mission"})
+            return self._send(200, job.model_dump())
+    return Handler
+
+def serve(host: str = None, port: int = None, max_concurrency: int = None):
+    settings = get_config().service
+    service = MissionService(max_concurrency or settings.max_concurrency, settings.log_dir)
+    service.warm_up()
+    server = ThreadingHTTPServer((host or settings.host, port or settings.port), _make_handler(service))
+    print(f"🛰️ Mission worker on http://{server.server_address[0]}:{server.server_address[1]} (max {service.max_concurrency} concurrent)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--concurrency", type=int)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.concurrency)
@@ -1,22 +1,51 @@
+import atexit
+import contextvars
+import json
 import os
+import threading
 import requests
 import urllib.parse
-from src.core.sandbox import DockerSandbox
+from contextlib import contextmanager
+from src.core.config import get_config
+from src.core.sandbox import DockerSandbox, SandboxPool
+from src.tools.research_engine.http_cache import get_http_cache
 
+_pool = None
+_pool_lock = threading.Lock()
 _sandbox_instance = None
+_current_sandbox: contextvars.ContextVar = contextvars.ContextVar("current_sandbox", default=None)
 
-def get_sandbox():
+def get_sandbox_pool() -> SandboxPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = get_config().sandbox
+            _pool = SandboxPool(settings.pool_size, settings.max_uses, settings.workspace_root)
+            atexit.register(_pool.shutdown)
+    return _pool
+
+@contextmanager
+def use_sandbox(sandbox: DockerSandbox):
+    """Make tools (run_shell, list_files) act on the mission's leased sandbox."""
+    token = _current_sandbox.set(sandbox)
+    try: yield sandbox
+    finally: _current_sandbox.reset(token)
+
+def get_sandbox() -> DockerSandbox:
     global _sandbox_instance
+    current = _current_sandbox.get()
+    if current is not None: return current
+    # Outside a mission: hold one pool slot for the lifetime of the process
     if _sandbox_instance is None:
-        _sandbox_instance = DockerSandbox()
+        _sandbox_instance = get_sandbox_pool().acquire()
     return _sandbox_instance
 
 def web_search(query: str) -> str:
     try:
-        url = f"http://localhost:8081/search?q={urllib.parse.quote(query)}&format=json"
-        res = requests.get(url, timeout=5)
-        if res.status_code == 200:
-            results = res.json().get('results', [])[:3]
+        url = f"http://localhost:8081/search?q={urllib.parse.quote(' '.join(query.split()))}&format=json"
+        res = get_http_cache().fetch(requests, url, timeout=5, ttl=get_http_cache().search_ttl)
+        if res["status"] == 200:
+            results = json.loads(res["body"]).get('results', [])[:3]
             return "\n".join([f"- {r['title']}: {r['url']}" for r in results])
     except: pass
     return "Search failed."
@@ -1,8 +1,10 @@
 import asyncio
+import atexit
+import json
 import os
 import threading
-from typing import Optional, Dict
-from contextlib import AsyncExitStack
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Optional, Dict, List
 
 try:
     from mcp import ClientSession, StdioServerParameters
@@ -13,13 +15,63 @@ except ImportError:
     MCP_AVAILABLE = False
     print("⚠️ MCP Library not found.")
 
+from src.core.config import get_config
 from src.tools.registry import ToolRegistry
 
-class MCPConnector:
-    def __init__(self, registry: ToolRegistry):
-        self.registry = registry
-        self.exit_stack = AsyncExitStack()
+class MCPServer:
+    """One named stdio server. A long-lived task owns the transport so it can be torn down cleanly."""
+    def __init__(self, name: str, command: str, args: list, env: Dict[str, str] = None):
+        self.name = name
+        self.params = StdioServerParameters(command=command, args=args, env={**os.environ, **(env or {})})
         self.session: Optional[ClientSession] = None
+        self.tools: Optional[list] = None # Cached list_tools() result, kept across reconnects
+        self.connects = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _serve(self, ready: asyncio.Future):
+        try:
+            async with stdio_client(self.params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    ready.set_result(None)
+                    await self._closing.wait()
+        except Exception as e:
+            if not ready.done(): ready.set_exception(e)
+        finally:
+            self.session = None
+
+    async def start(self, timeout: float):
+        self._closing = asyncio.Event()
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._serve(ready))
+        await asyncio.wait_for(ready, timeout)
+        self.connects += 1
+
+    async def stop(self):
+        if self._task is None: return
+        self._closing.set()
+        try: await asyncio.wait_for(self._task, 5)
+        except Exception: self._task.cancel()
+        self._task = None
+
+    async def ensure(self, timeout: float) -> ClientSession:
+        # One reconnect at a time; concurrent callers wait for it and share the new session
+        if self._lock is None: self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.session is None:
+                await self.stop()
+                await self.start(timeout)
+        return self.session
+
+class MCPConnector:
+    """MCP server sessions on one background loop, shared by every mission in the process.
+    Servers stay up between missions; each mission only registers their tools in its own registry."""
+    def __init__(self):
+        self.servers: Dict[str, MCPServer] = {} # key (name + command line) -> server
+        self._lock = threading.Lock()
         self._loop = asyncio.new_event_loop()
         self._thread = threading.Thread(target=self._start_background_loop, daemon=True)
         self._thread.start()
@@ -28,42 +80,118 @@ class MCPConnector:
         asyncio.set_event_loop(self._loop)
         self._loop.run_forever()
 
-    def connect(self, command: str, args: list, env: Dict[str, str] = None):
+    def _run(self, coro, timeout: float):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try: return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    @staticmethod
+    def server_key(name: str, command: str, args: list, env: Dict[str, str] = None) -> str:
+        return json.dumps([name, command, list(args), env or {}], sort_keys=True)
+
+    def connect(self, registry: ToolRegistry, command: str, args: list, env: Dict[str, str] = None, name: str = None) -> List[str]:
+        """Register server `name`'s tools in `registry`, starting the server unless one with the same
+        command line is already up; returns the registered tool names."""
         if not MCP_AVAILABLE: return "MCP Library missing"
-        future = asyncio.run_coroutine_threadsafe(
-            self._connect_async(command, args, env), 
-            self._loop
-        )
-        return future.result()
-
-    async def _connect_async(self, command: str, args: list, env: Dict[str, str]):
-        server_params = StdioServerParameters(command=command, args=args, env={**os.environ, **(env or {})})
-        stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
-        self.session = await self.exit_stack.enter_async_context(ClientSession(stdio_transport[0], stdio_transport[1]))
-        await self.session.initialize()
-        
-        result = await self.session.list_tools()
-        print(f"🔌 Connected to MCP: {command} (Found {len(result.tools)} tools)")
-
-        for tool in result.tools:
-            self._register_mcp_tool(tool)
-
-    def _register_mcp_tool(self, tool_info):
+        settings = get_config().mcp
+        name = name or os.path.basename(command)
+        key = self.server_key(name, command, args, env)
+        with self._lock:
+            server = self.servers.get(key)
+            started = server is None
+            if started: server = self.servers[key] = MCPServer(name, command, args, env)
+        # A reused server reconnects only if its session died; its tool list stays cached
+        tools = self._run(self._connect_async(server), settings.connect_timeout_s + 5)
+        if started: print(f"🔌 Connected to MCP [{name}]: {command} (Found {len(tools)} tools)")
+        return [self._register_mcp_tool(registry, key, server, tool) for tool in tools]
+
+    async def _connect_async(self, server: MCPServer):
+        await server.ensure(get_config().mcp.connect_timeout_s)
+        return await self._list_tools_async(server)
+
+    async def _list_tools_async(self, server: MCPServer, refresh: bool = False):
+        if server.tools is None or refresh:
+            session = await server.ensure(get_config().mcp.connect_timeout_s)
+            server.tools = (await session.list_tools()).tools
+        return server.tools
+
+    def list_tools(self, key: str, refresh: bool = False) -> list:
+        return self._run(self._list_tools_async(self.servers[key], refresh), get_config().mcp.connect_timeout_s + 5)
+
+    async def call_tool_async(self, key: str, tool_name: str, arguments: dict, timeout: float = None):
+        settings = get_config().mcp
+        timeout = timeout or settings.call_timeout_s
+        server = self.servers[key]
+        name = server.name
+        for attempt in range(2):
+            session = await server.ensure(settings.connect_timeout_s)
+            try: return await asyncio.wait_for(session.call_tool(tool_name, arguments=arguments), timeout)
+            except asyncio.TimeoutError: raise
+            except Exception as e:
+                # A dead transport gets one reconnect; tool errors from a live session are returned as is
+                if attempt or not self._is_disconnect(e): raise
+                print(f"🔌 MCP [{name}] connection lost ({e}); reconnecting")
+                await server.stop()
+
+    @staticmethod
+    def _is_disconnect(error: Exception) -> bool:
+        if isinstance(error, (OSError, EOFError)): return True
+        if type(error).__name__ in ("ClosedResourceError", "BrokenResourceError", "EndOfStream"): return True
+        # mcp reports a dead stdio transport as McpError/MCPError("Connection closed")
+        return "connection closed" in str(error).lower()
+
+    def call_tool(self, key: str, tool_name: str, arguments: dict, timeout: float = None) -> str:
+        """Blocking call that only holds this thread; other calls proceed concurrently on the loop."""
+        timeout = timeout or get_config().mcp.call_timeout_s
+        try: result = self._run(self.call_tool_async(key, tool_name, arguments, timeout), timeout + 5)
+        except (asyncio.TimeoutError, FutureTimeout):
+            return f"Error: MCP tool '{tool_name}' on [{self.servers[key].name}] timed out after {timeout:g}s"
+        output_text = []
+        for content in result.content:
+            if isinstance(content, TextContent): output_text.append(content.text)
+            else: output_text.append(str(content))
+        return "\n".join(output_text)
+
+    def _register_mcp_tool(self, registry: ToolRegistry, key: str, server: MCPServer, tool_info) -> str:
         tool_name = tool_info.name
         tool_desc = tool_info.description or f"External tool: {tool_name}"
-        
+        # inputSchema in mcp 1.x, input_schema in 2.x
+        schema = getattr(tool_info, "inputSchema", None) or getattr(tool_info, "input_schema", None) or {"type": "object", "properties": {}}
+        properties = list((schema.get("properties") or {}).keys())
+        # Same tool name from two servers: the later one is namespaced
+        existing = registry.get(tool_name)
+        registered = tool_name if existing is None or getattr(existing.func, "mcp_server", None) == server.name else f"{server.name}__{tool_name}"
+
         def mcp_tool_wrapper(**kwargs):
-            future = asyncio.run_coroutine_threadsafe(
-                self.session.call_tool(tool_name, arguments=kwargs),
-                self._loop
-            )
-            result = future.result()
-            output_text = []
-            for content in result.content:
-                if isinstance(content, TextContent): output_text.append(content.text)
-                else: output_text.append(str(content))
-            return "\n".join(output_text)
-
-        mcp_tool_wrapper.__name__ = tool_name
+            # Smart Mapping: the orchestrator passes a single 'argument'
+            if len(properties) == 1 and properties[0] not in kwargs and len(kwargs) == 1:
+                kwargs = {properties[0]: next(iter(kwargs.values()))}
+            return self.call_tool(key, tool_name, kwargs)
+
+        mcp_tool_wrapper.__name__ = registered
         mcp_tool_wrapper.__doc__ = tool_desc
-        self.registry.register(mcp_tool_wrapper, description=tool_desc)
+        mcp_tool_wrapper.mcp_server = server.name
+        registry.register(mcp_tool_wrapper, description=tool_desc, parameters=schema)
+        return registered
+
+    def disconnect(self, key: str):
+        with self._lock: server = self.servers.pop(key, None)
+        if server: self._run(server.stop(), 10)
+
+    def close(self):
+        for key in list(self.servers): self.disconnect(key)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+_connector: Optional[MCPConnector] = None
+_connector_lock = threading.Lock()
+
+def get_mcp_connector() -> MCPConnector:
+    """Process-wide connector, so server processes and their tool lists outlive a single mission."""
+    global _connector
+    with _connector_lock:
+        if _connector is None:
+            _connector = MCPConnector()
+            atexit.register(_connector.close)
+    return _connector
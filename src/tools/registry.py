@@ -1,38 +1,156 @@
+import asyncio
+import contextvars
 import inspect
 import json
-from typing import Callable, Any, Dict
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Any, Dict, List, Optional, Tuple
+from src.core.tracing import span
+
+CACHE_POLICIES = ("none", "mission", "ttl")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Shared by every registry so per-mission registries don't each leave idle threads behind
+    global _executor
+    with _executor_lock:
+        if _executor is None: _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+    return _executor
+
+class Tool:
+    """A registered callable plus what the registry precomputes about it."""
+    def __init__(self, func: Callable, name: str, cache: str = "none", ttl: Optional[float] = None,
+                 timeout: Optional[float] = None, max_concurrency: Optional[int] = None, invalidates: List[str] = (),
+                 cacheable: Optional[Callable[[str], bool]] = None, ignore_args: List[str] = ()):
+        if cache not in CACHE_POLICIES: raise ValueError(f"Unknown cache policy '{cache}'")
+        if cache == "ttl" and not ttl: raise ValueError("cache='ttl' needs a ttl")
+        self.func = func
+        self.name = name
+        self.params = [p.name for p in inspect.signature(func).parameters.values()
+                       if p.name != "self" and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+        # Smart Mapping: a one-parameter tool receives the first value it is given
+        self.single_arg = len(self.params) == 1
+        self.cache = cache
+        self.ttl = ttl
+        self.timeout = timeout
+        self.invalidates = list(invalidates)
+        self.ignore_args = set(ignore_args)
+        self.cacheable = cacheable or (lambda result: not result.startswith("Error"))
+        self.semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def bind(self, kwargs: dict) -> dict:
+        if self.single_arg and kwargs: return {self.params[0]: next(iter(kwargs.values()))}
+        return kwargs
+
+    def cache_key(self, kwargs: dict) -> str:
+        normalized = {k: " ".join(v.split()) if isinstance(v, str) else v for k, v in kwargs.items() if k not in self.ignore_args}
+        return json.dumps([self.name, normalized], sort_keys=True, default=str)
 
 class ToolRegistry:
     def __init__(self):
-        self._tools: Dict[str, Callable] = {}
+        self._tools: Dict[str, Tool] = {}
         self._schemas: Dict[str, Any] = {}
+        self._cache: Dict[str, Tuple[Optional[float], str]] = {} # key -> (expires_at, result)
+        self._cache_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "timeouts": 0}
 
-    def register(self, func: Callable, description: str = ""):
+    def register(self, func: Callable, description: str = "", cache: str = "none", ttl: Optional[float] = None,
+                 timeout: Optional[float] = None, max_concurrency: Optional[int] = None, invalidates: List[str] = (),
+                 parameters: Optional[dict] = None, cacheable: Optional[Callable[[str], bool]] = None,
+                 ignore_args: List[str] = ()):
+        """cache: "none", "mission" (kept for this registry's lifetime) or "ttl" (expires after `ttl` seconds).
+        invalidates: tools whose cached results this tool's side effects make stale.
+        cacheable: whether a result may be cached; by default anything but an "Error..." string.
+        ignore_args: arguments the tool doesn't use, left out of the cache key.
+        parameters: JSON schema to advertise instead of one derived from the signature."""
         name = func.__name__
-        self._tools[name] = func
-        sig = inspect.signature(func)
-        params = {}
-        for param_name, param in sig.parameters.items():
-            if param_name == 'self': continue
-            params[param_name] = {"type": "string", "description": f"Parameter {param_name}"}
+        tool = Tool(func, name, cache, ttl, timeout, max_concurrency, invalidates, cacheable, ignore_args)
+        self._tools[name] = tool
+        if parameters is None:
+            params = {p: {"type": "string", "description": f"Parameter {p}"} for p in tool.params}
+            parameters = {"type": "object", "properties": params, "required": list(params.keys())}
         self._schemas[name] = {
             "name": name,
             "description": description or func.__doc__,
-            "parameters": {"type": "object", "properties": params, "required": list(params.keys())}
+            "parameters": parameters
         }
 
+    def get(self, tool_name: str) -> Optional[Tool]:
+        return self._tools.get(tool_name)
+
+    def unregister(self, tool_name: str):
+        self._tools.pop(tool_name, None)
+        self._schemas.pop(tool_name, None)
+        self.invalidate(tool_name)
+
     def get_tool_definitions(self) -> str:
         return json.dumps(list(self._schemas.values()), indent=2)
 
+    def invalidate(self, tool_name: str = None):
+        """Drop cached results for one tool, or for all of them."""
+        prefix = json.dumps([tool_name])[:-1] if tool_name else ""
+        with self._cache_lock:
+            for key in [k for k in self._cache if k.startswith(prefix)]: del self._cache[key]
+
     def execute(self, tool_name: str, **kwargs) -> str:
-        if tool_name not in self._tools: return f"Error: Tool '{tool_name}' not found."
-        func = self._tools[tool_name]
+        with span("tool.execute", tool=tool_name, args_chars=sum(len(str(v)) for v in kwargs.values())) as s:
+            result, cache_hit = self._execute(tool_name, **kwargs)
+            s.set(result_chars=len(result), failed=result.startswith("Error"), cache_hit=cache_hit)
+            return result
+
+    def submit(self, tool_name: str, **kwargs) -> Future:
+        """Non-blocking execute; the call sees the caller's context (sandbox, current span)."""
+        return _get_executor().submit(contextvars.copy_context().run, self.execute, tool_name, **kwargs)
+
+    async def aexecute(self, tool_name: str, **kwargs) -> str:
+        return await asyncio.wrap_future(self.submit(tool_name, **kwargs))
+
+    def execute_many(self, calls: List[Tuple[str, dict]]) -> List[str]:
+        """Run (tool_name, kwargs) pairs concurrently; results come back in call order."""
+        futures = [self.submit(name, **kwargs) for name, kwargs in calls]
+        return [f.result() for f in futures]
+
+    def _execute(self, tool_name: str, **kwargs) -> Tuple[str, bool]:
+        if tool_name not in self._tools: return f"Error: Tool '{tool_name}' not found.", False
+        tool = self._tools[tool_name]
+        kwargs = tool.bind(kwargs)
+        key = tool.cache_key(kwargs) if tool.cache != "none" else None
+        if key:
+            with self._cache_lock:
+                entry = self._cache.get(key)
+                if entry and (entry[0] is None or entry[0] > time.time()):
+                    self.stats["hits"] += 1
+                    return entry[1], True
+            self.stats["misses"] += 1
+
+        result = self._call(tool, kwargs)
+        for name in tool.invalidates: self.invalidate(name)
+        if key and tool.cacheable(result):
+            with self._cache_lock:
+                self._cache[key] = (time.time() + tool.ttl if tool.cache == "ttl" else None, result)
+        return result, False
+
+    def _call(self, tool: Tool, kwargs: dict) -> str:
+        def run():
+            if tool.semaphore: tool.semaphore.acquire()
+            try: return str(tool.func(**kwargs))
+            finally:
+                if tool.semaphore: tool.semaphore.release()
         try:
-            sig = inspect.signature(func)
-            # Smart Mapping: If function takes 1 arg, give it the first available value
-            if len(sig.parameters) == 1 and kwargs:
-                val = next(iter(kwargs.values()))
-                return str(func(val))
-            return str(func(**kwargs))
+            if not tool.timeout: return run()
+            # Own daemon thread rather than the shared pool: execute_many callers may already fill it.
+            # The thread can't be killed; a late result is discarded
+            future, ctx = Future(), contextvars.copy_context()
+            def target():
+                try: future.set_result(ctx.run(run))
+                except BaseException as e: future.set_exception(e)
+            threading.Thread(target=target, daemon=True, name=f"tool-{tool.name}").start()
+            try: return future.result(timeout=tool.timeout)
+            except FutureTimeout:
+                self.stats["timeouts"] += 1
+                return f"Error: Tool '{tool.name}' timed out after {tool.timeout:g}s"
         except Exception as e:
             return f"Error executing tool: {e}"
@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Any, Optional
+from src.core.cache import DiskCache
+from src.core.config import get_config, resolve_path
+
+MAX_BODY_CHARS = 2_000_000
+
+class HttpCache:
+    """Shared on-disk cache for HTTP payloads (+ extracted text) and search results."""
+    def __init__(self, path: str, ttl: float, search_ttl: float, max_entries: int, max_bytes: int, enabled: bool = True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.search_ttl = search_ttl
+        # No max_age here: stale entries are kept so they can be revalidated with ETag/Last-Modified
+        self.store = DiskCache(path, max_entries=max_entries, max_bytes=max_bytes) if enabled else None
+        self.stats = {"fresh_hits": 0, "revalidated": 0, "fetched": 0}
+
+    @staticmethod
+    def _key(url: str, params: Optional[dict]) -> str:
+        return DiskCache.make_key("http", url, sorted((params or {}).items()))
+
+    def fetch(self, session, url: str, params: dict = None, timeout: float = 10, ttl: float = None) -> dict:
+        """GET through the cache. Returns {status, body, text, etag, last_modified}."""
+        if not self.enabled:
+            res = session.get(url, params=params, timeout=timeout)
+            return {"status": res.status_code, "body": res.text, "text": None}
+        key = self._key(url, params)
+        entry = self.store.get_entry(key)
+        ttl = self.ttl if ttl is None else ttl
+        if entry and time.time() - entry[1] < ttl:
+            self.stats["fresh_hits"] += 1
+            return entry[0]
+
+        headers = {}
+        if entry:
+            if entry[0].get("etag"): headers["If-None-Match"] = entry[0]["etag"]
+            if entry[0].get("last_modified"): headers["If-Modified-Since"] = entry[0]["last_modified"]
+        res = session.get(url, params=params, headers=headers, timeout=timeout)
+        if res.status_code == 304 and entry:
+            self.stats["revalidated"] += 1
+            self.store.set(key, entry[0]) # Restamp freshness, keep payload and extracted text
+            return entry[0]
+
+        self.stats["fetched"] += 1
+        value = {
+            "status": res.status_code,
+            "body": res.text[:MAX_BODY_CHARS],
+            "text": None,
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+        }
+        if res.status_code == 200: self.store.set(key, value)
+        return value
+
+    def store_text(self, url: str, text: str, params: dict = None):
+        """Attach extracted text to a cached payload so later hits skip extraction."""
+        if not self.enabled: return
+        key = self._key(url, params)
+        entry = self.store.get_entry(key)
+        if entry:
+            entry[0]["text"] = text
+            self.store.set(key, entry[0])
+
+    def get_result(self, namespace: str, *parts: Any) -> Optional[Any]:
+        if not self.enabled: return None
+        return self.store.get(DiskCache.make_key(namespace, *parts), max_age=self.search_ttl)
+
+    def set_result(self, namespace: str, value: Any, *parts: Any):
+        if self.enabled: self.store.set(DiskCache.make_key(namespace, *parts), value)
+
+_http_cache: Optional[HttpCache] = None
+_lock = threading.Lock()
+
+def get_http_cache() -> HttpCache:
+    global _http_cache
+    with _lock:
+        if _http_cache is None:
+            s = get_config().http_cache
+            _http_cache = HttpCache(
+                resolve_path(s.path), ttl=s.ttl_hours * 3600, search_ttl=s.search_ttl_hours * 3600,
+                max_entries=s.max_entries, max_bytes=s.max_mb * 1024 * 1024, enabled=s.enabled
+            )
+    return _http_cache
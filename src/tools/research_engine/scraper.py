@@ -1,31 +1,90 @@
+import contextvars
+import time
 import trafilatura
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from typing import Dict, List
+from src.tools.research_engine.http_cache import get_http_cache
+from src.core.tracing import span
 
 class WebScraper:
+    def __init__(self, timeout: float = 10, pool_size: int = 8):
+        self.timeout = timeout
+        # One session = keep-alive connections pooled per host across all fetches
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "EMACS-RESEARCHER/1.0"
+        self.cache = get_http_cache()
+
     def scrape(self, url: str) -> str:
         """Download and extract clean text from URL"""
+        with span("research.scrape", url=url) as s:
+            text = self._scrape(url)
+            s.set(text_chars=len(text))
+            return text
+
+    def _scrape(self, url: str) -> str:
         try:
-            downloaded = trafilatura.fetch_url(url)
+            page = self.cache.fetch(self.session, url, timeout=self.timeout)
+            if page.get("text"): return page["text"] # Extracted on an earlier visit
+            # Error pages (403/404/5xx) have bodies too; don't let them count as sources
+            if page["status"] != 200: return f"Error scraping {url}: HTTP {page['status']}"
+            downloaded = page["body"]
+            text = None
             if downloaded:
                 # Try Trafilatura extraction (Best for articles/blogs)
                 text = trafilatura.extract(downloaded, include_comments=False, include_tables=True)
                 if text:
-                    return self._post_process(text)
-            
-            # Fallback: BeautifulSoup (Better for some doc sites)
-            return self._fallback_scrape(url)
+                    text = self._post_process(text)
+
+            # Fallback: BeautifulSoup on the same payload (Better for some doc sites)
+            text = text or self._fallback_scrape(downloaded)
+            if self.is_usable(text): self.cache.store_text(url, text)
+            return text
         except Exception as e:
             return f"Error scraping {url}: {e}"
 
-    def _fallback_scrape(self, url):
+    def scrape_many(self, urls: List[str], max_workers: int = 4, deadline: float = 20,
+                    enough_sources: int = 3, enough_chars: int = 12000) -> Dict[str, str]:
+        """Fetch URLs concurrently; stop at the deadline or once enough usable text has arrived."""
+        results: Dict[str, str] = {}
+        if not urls: return results
+        start = time.time()
+        pool = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+        # Copy the caller's context so scrape spans nest under the research span
+        futures = {pool.submit(contextvars.copy_context().run, self.scrape, url): url for url in urls}
         try:
-            res = requests.get(url, timeout=10, headers={"User-Agent": "EMACS-RESEARCHER/1.0"})
-            soup = BeautifulSoup(res.text, 'html.parser')
-            
+            for future in as_completed(futures, timeout=deadline):
+                url = futures[future]
+                content = future.result()
+                print(f"   Read: {url} ({len(content)} chars, {time.time() - start:.1f}s)")
+                if self.is_usable(content): results[url] = content
+                usable_chars = sum(len(c) for c in results.values())
+                if len(results) >= enough_sources or usable_chars >= enough_chars:
+                    print(f"   ✅ Enough material after {time.time() - start:.1f}s")
+                    break
+        except FuturesTimeout:
+            print(f"   ⏱️ Research deadline ({deadline}s) hit with {len(results)} usable sources")
+        finally:
+            # Stragglers are abandoned, not waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    @staticmethod
+    def is_usable(content: str) -> bool:
+        return len(content) > 100 and not content.startswith(("Error scraping", "Failed to scrape"))
+
+    def _fallback_scrape(self, html):
+        try:
+            soup = BeautifulSoup(html, 'html.parser')
+
             # Kill script and style elements
             for script in soup(["script", "style", "nav", "footer"]):
-                script.extract()    
+                script.extract()
 
             text = soup.get_text()
             # Break into lines and remove leading and trailing space on each
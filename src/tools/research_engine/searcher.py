@@ -2,18 +2,33 @@ import requests
 import json
 import urllib.parse
 from duckduckgo_search import DDGS
+from src.tools.research_engine.http_cache import get_http_cache
+from src.core.tracing import span
 
 class SearchEngine:
     def __init__(self):
         self.searx_url = "http://localhost:8081/search"
+        self.cache = get_http_cache()
     
     def search(self, query: str, limit: int = 5):
         """Try SearXNG first, fallback to DuckDuckGo"""
+        with span("research.search", query=query, limit=limit) as s:
+            results = self._search(query, limit)
+            s.set(results=len(results))
+            return results
+
+    def _search(self, query: str, limit: int):
+        normalized = " ".join(query.lower().split())
+        cached = self.cache.get_result("search", normalized, limit)
+        if cached:
+            print(f"⚡ Search Cache Hit: {query}")
+            return cached
         print(f"🔎 Searching: {query}")
         results = self._search_searxng(query, limit)
         if not results:
             print("⚠️ SearXNG failed/empty. Switching to DuckDuckGo...")
             results = self._search_ddg(query, limit)
+        if results: self.cache.set_result("search", results, normalized, limit)
         return results
 
     def _search_searxng(self, query: str, limit: int):